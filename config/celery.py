@@ -3,6 +3,7 @@ import os
 from django.conf import settings
 
 from celery import Celery
+from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
@@ -21,6 +22,38 @@ app.conf.update(
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Periodic tasks (run with `celery -A config beat`)
+app.conf.beat_schedule = {
+    'flush-user-activity': {
+        'task': 'freelancing.custom_auth.tasks.flush_user_activity',
+        'schedule': 60.0,
+    },
+    'reconcile-voucher-redemption-counters': {
+        'task': 'freelancing.voucher.tasks.reconcile_voucher_redemption_counters',
+        'schedule': 60.0,
+    },
+    'expire-overdue-vouchers': {
+        'task': 'freelancing.voucher.tasks.expire_overdue_vouchers',
+        'schedule': crontab(minute='*/15'),
+    },
+    'snapshot-wallets': {
+        'task': 'freelancing.custom_auth.tasks.snapshot_wallets',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'drain-email-outbox': {
+        'task': 'freelancing.custom_auth.tasks.drain_email_outbox',
+        'schedule': 60.0,
+    },
+    'flush-advertisement-stats': {
+        'task': 'freelancing.voucher.tasks.flush_advertisement_stats',
+        'schedule': 60.0,
+    },
+    'renormalize-trending-scores': {
+        'task': 'freelancing.voucher.tasks.renormalize_trending_scores',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
 
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
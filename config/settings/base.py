@@ -49,6 +49,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_celery_results',
     # 'django_celery_beat',
 ]
@@ -59,7 +60,6 @@ THIRD_PARTY_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     # 'drf_secure_token',
     'django_filters',
-    'drf_api_logger',
     'django_crontab',
     'unicef_restlib',
     'drf_yasg',  # For swagger
@@ -84,9 +84,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'drf_api_logger.middleware.api_logger_middleware.APILoggerMiddleware',
+    'freelancing.custom_auth.middleware.RequestLogMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'freelancing.custom_auth.middleware.TokenBlacklistMiddleware',
+    'freelancing.custom_auth.middleware.UpdateUserActivityMiddleware',
     'django.middleware.locale.LocaleMiddleware',
 ]
 
@@ -104,7 +105,7 @@ AUTHENTICATION_BACKENDS = (
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'freelancing.custom_auth.auth_backends.authentication.CachedJWTAuthentication',
 
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -201,7 +202,127 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 TEMPLATED_EMAIL_TEMPLATE_DIR = 'email/'
 TEMPLATED_EMAIL_FILE_EXTENSION = 'html'
 
-DRF_API_LOGGER_DATABASE = True
+# API request log
+# --------------------------------------------------------------------------
+# Requests are logged by RequestLogMiddleware through a background writer thread
+API_LOG_ENABLED = env.bool('API_LOG_ENABLED', default=True)
+# 'database' (APIRequestLog rows) or 'file' (rotating JSON lines file)
+API_LOG_BACKEND = env('API_LOG_BACKEND', default='database')
+API_LOG_FILE = env('API_LOG_FILE', default=os.path.join(BASE_DIR, 'logs', 'api_requests.jsonl'))
+API_LOG_FILE_MAX_BYTES = env.int('API_LOG_FILE_MAX_BYTES', default=50 * 1024 * 1024)
+API_LOG_FILE_BACKUP_COUNT = env.int('API_LOG_FILE_BACKUP_COUNT', default=5)
+# Records waiting to be written; further records are dropped rather than blocking requests
+API_LOG_QUEUE_SIZE = env.int('API_LOG_QUEUE_SIZE', default=10000)
+API_LOG_BATCH_SIZE = env.int('API_LOG_BATCH_SIZE', default=200)
+API_LOG_FLUSH_INTERVAL = env.float('API_LOG_FLUSH_INTERVAL', default=2.0)
+API_LOG_MAX_BODY_LENGTH = env.int('API_LOG_MAX_BODY_LENGTH', default=2000)
+# Share of requests logged, by longest matching path prefix; server errors are always logged
+API_LOG_DEFAULT_SAMPLE_RATE = env.float('API_LOG_DEFAULT_SAMPLE_RATE', default=1.0)
+API_LOG_SAMPLE_RATES = {
+    '/admin/': 0,
+    '/static/': 0,
+    '/media/': 0,
+    '/api/voucher/v1/advertisements/active/': 0.01,
+    '/api/voucher/v1/advertisements/by-location/': 0.01,
+    '/api/voucher/v1/public/': 0.1,
+}
+# Body keys containing any of these are masked in the log
+API_LOG_REDACT_FIELDS = (
+    'password', 'otp', 'pin', 'token', 'secret', 'social_key', 'api_key', 'access', 'refresh',
+)
+
+# Site settings cache
+# --------------------------------------------------------------------------
+# Seconds a SiteSetting value lives in the shared cache / in each process
+SITE_SETTING_CACHE_TIMEOUT = env.int('SITE_SETTING_CACHE_TIMEOUT', default=300)
+SITE_SETTING_LOCAL_CACHE_TIMEOUT = env.int('SITE_SETTING_LOCAL_CACHE_TIMEOUT', default=30)
+
+# Seconds between incremental syncs of the revoked access token set
+TOKEN_REVOCATION_SYNC_INTERVAL = env.int('TOKEN_REVOCATION_SYNC_INTERVAL', default=60)
+
+# User activity tracking
+# --------------------------------------------------------------------------
+# Record a user's activity at most once per interval, flush buffered values every
+USER_ACTIVITY_WRITE_INTERVAL = env.int('USER_ACTIVITY_WRITE_INTERVAL', default=60)
+USER_ACTIVITY_FLUSH_INTERVAL = env.int('USER_ACTIVITY_FLUSH_INTERVAL', default=60)
+
+# Voucher redemption counter
+# --------------------------------------------------------------------------
+# Spread increments of uncapped vouchers over N counter rows (1 = no sharding)
+VOUCHER_REDEMPTION_COUNTER_SHARDS = env.int('VOUCHER_REDEMPTION_COUNTER_SHARDS', default=1)
+# Serve the purchase summary from the incrementally maintained UserVoucherStats row
+VOUCHER_STATS_MATERIALIZED = env.bool('VOUCHER_STATS_MATERIALIZED', default=False)
+
+# Voucher expiry
+# --------------------------------------------------------------------------
+# Rows locked and updated per transaction; seconds an expiry run holds its lock
+VOUCHER_EXPIRY_BATCH_SIZE = env.int('VOUCHER_EXPIRY_BATCH_SIZE', default=1000)
+VOUCHER_EXPIRY_LOCK_TIMEOUT = env.int('VOUCHER_EXPIRY_LOCK_TIMEOUT', default=3600)
+
+# Merchant / voucher autocomplete (per-process index)
+# --------------------------------------------------------------------------
+# Seconds between incremental syncs and full rebuilds of the index
+AUTOCOMPLETE_SYNC_INTERVAL = env.int('AUTOCOMPLETE_SYNC_INTERVAL', default=60)
+AUTOCOMPLETE_REBUILD_INTERVAL = env.int('AUTOCOMPLETE_REBUILD_INTERVAL', default=3600)
+
+# WhatsApp contact sync
+# --------------------------------------------------------------------------
+# Dotted path of the status provider: LocalStatusProvider (offline) or HttpStatusProvider
+WHATSAPP_STATUS_PROVIDER = env(
+    'WHATSAPP_STATUS_PROVIDER', default='freelancing.voucher.whatsapp.LocalStatusProvider'
+)
+WHATSAPP_STATUS_API_URL = env('WHATSAPP_STATUS_API_URL', default='')
+# Dotted path of the message provider: LocalMessageProvider (offline) or HttpMessageProvider
+WHATSAPP_MESSAGE_PROVIDER = env(
+    'WHATSAPP_MESSAGE_PROVIDER', default='freelancing.voucher.whatsapp.LocalMessageProvider'
+)
+WHATSAPP_MESSAGE_API_URL = env('WHATSAPP_MESSAGE_API_URL', default='')
+WHATSAPP_API_TOKEN = env('WHATSAPP_API_TOKEN', default='')
+# Seconds a number's status is shared between users before it is checked again
+WHATSAPP_STATUS_CACHE_TIMEOUT = env.int('WHATSAPP_STATUS_CACHE_TIMEOUT', default=86400)
+# Concurrent provider calls, numbers checked (and cached) per batch, rows per bulk query
+WHATSAPP_STATUS_CHECK_WORKERS = env.int('WHATSAPP_STATUS_CHECK_WORKERS', default=8)
+WHATSAPP_STATUS_CHECK_BATCH_SIZE = env.int('WHATSAPP_STATUS_CHECK_BATCH_SIZE', default=100)
+WHATSAPP_CONTACT_SYNC_BATCH_SIZE = env.int('WHATSAPP_CONTACT_SYNC_BATCH_SIZE', default=500)
+# Gift card fan-out: recipients per provider call, concurrent calls, messages per second (0 = unlimited)
+WHATSAPP_SEND_BATCH_SIZE = env.int('WHATSAPP_SEND_BATCH_SIZE', default=50)
+WHATSAPP_SEND_WORKERS = env.int('WHATSAPP_SEND_WORKERS', default=4)
+WHATSAPP_SEND_RATE_LIMIT = env.int('WHATSAPP_SEND_RATE_LIMIT', default=20)
+# Retries of a batch whose provider call failed outright
+WHATSAPP_SEND_MAX_RETRIES = env.int('WHATSAPP_SEND_MAX_RETRIES', default=3)
+
+# Transactional email outbox
+# --------------------------------------------------------------------------
+# Rows sent per claimed batch; attempts before a row is marked failed; first retry delay
+# in seconds, doubled per attempt
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5)
+EMAIL_OUTBOX_RETRY_DELAY = env.int('EMAIL_OUTBOX_RETRY_DELAY', default=60)
+
+# Image derivatives
+# --------------------------------------------------------------------------
+# Encoding of the resized copies of uploaded images (WEBP or JPEG) and its quality
+IMAGE_DERIVATIVE_FORMAT = env('IMAGE_DERIVATIVE_FORMAT', default='WEBP')
+IMAGE_DERIVATIVE_QUALITY = env.int('IMAGE_DERIVATIVE_QUALITY', default=80)
+
+# Wallet ledger
+# --------------------------------------------------------------------------
+# Wallet history younger than this is left out of snapshots, so entries still being committed are not skipped
+WALLET_SNAPSHOT_SETTLE_SECONDS = env.int('WALLET_SNAPSHOT_SETTLE_SECONDS', default=300)
+
+# Trending vouchers
+# --------------------------------------------------------------------------
+# Hours after which a purchase or redemption counts half as much towards the trending score
+TRENDING_HALF_LIFE_HOURS = env.int('TRENDING_HALF_LIFE_HOURS', default=72)
+
+# Advertisement index
+# --------------------------------------------------------------------------
+# Seconds between checks of whether an advertisement change invalidated the in-process index
+AD_INDEX_CHECK_INTERVAL = env.int('AD_INDEX_CHECK_INTERVAL', default=5)
+# Seconds after which the index is rebuilt regardless
+AD_INDEX_REBUILD_INTERVAL = env.int('AD_INDEX_REBUILD_INTERVAL', default=300)
+# Seconds between inline flushes of advertisement impressions/clicks when the cache is not Redis
+AD_STATS_FLUSH_INTERVAL = env.int('AD_STATS_FLUSH_INTERVAL', default=60)
 
 # to allow to access api in react
 CORS_ORIGIN_ALLOW_ALL = True
@@ -262,13 +383,23 @@ SIMPLE_JWT = {
 MENU_ITEM_IMAGE = "menu_item_image"
 
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Redis URL
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+REDIS_URL = env('REDIS_URL', default='redis://localhost:6379/0')
+
+CELERY_BROKER_URL = REDIS_URL  # Redis URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']  # Accepted content types
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = "Asia/Kolkata"
 
+# Cache configuration
+# --------------------------------------------------------------------------
+# Per-process LocMem unless CACHE_URL is set (e.g. redis://host:6379/1)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+CACHES['default']['KEY_PREFIX'] = PROJECT_FULL_NAME
+
 JAZZMIN_SETTINGS = {
     # title of the window (Will default to current_admin_site.site_title if absent or None)
     "site_title": "Library Admin",
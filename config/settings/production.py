@@ -24,6 +24,14 @@ DATABASES = {
     }
 }
 
+# Cache
+# --------------------------------------------------------------------------
+# Share the cache across workers through the same Redis that backs Celery
+CACHES = {
+    'default': env.cache('CACHE_URL', default=REDIS_URL),
+}
+CACHES['default']['KEY_PREFIX'] = PROJECT_FULL_NAME
+
 # E-mail settings
 # -----------------------------------------------------------
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
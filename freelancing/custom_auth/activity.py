@@ -0,0 +1,136 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+
+class UserActivityTracker:
+    """
+        Coalesces "last seen" writes for authenticated users.
+
+        Each process records a user at most once per USER_ACTIVITY_WRITE_INTERVAL
+        seconds. Recorded timestamps are buffered in a Redis hash when the
+        default cache is Redis, otherwise in this process, and written to the
+        database in one bulk_update by flush() (see the flush_user_activity
+        Celery task). Without Redis the buffer is also flushed inline once per
+        USER_ACTIVITY_FLUSH_INTERVAL, since a worker process cannot see it.
+    """
+
+    DIRTY_KEY = "user_activity:dirty"
+    MAX_TRACKED_USERS = 10000
+
+    def __init__(self):
+        self._last_recorded = {}
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _write_interval():
+        return getattr(settings, "USER_ACTIVITY_WRITE_INTERVAL", 60)
+
+    @staticmethod
+    def _redis_client():
+        if isinstance(cache, RedisCache):
+            return cache._cache.get_client(write=True)
+        return None
+
+    def touch(self, user_id, when=None):
+        """
+            Record activity for a user; returns False when throttled
+        """
+        now = time.monotonic()
+        last = self._last_recorded.get(user_id)
+        if last is not None and now - last < self._write_interval():
+            return False
+
+        if len(self._last_recorded) >= self.MAX_TRACKED_USERS:
+            self._prune(now)
+        self._last_recorded[user_id] = now
+
+        when = when or timezone.now()
+        client = self._redis_client()
+        if client is not None:
+            client.hset(cache.make_key(self.DIRTY_KEY), user_id, when.timestamp())
+            return True
+
+        with self._lock:
+            self._pending[user_id] = when
+        if now - self._last_flush >= getattr(settings, "USER_ACTIVITY_FLUSH_INTERVAL", 60):
+            self.flush()
+        return True
+
+    def _prune(self, now):
+        interval = self._write_interval()
+        with self._lock:
+            self._last_recorded = {
+                user_id: recorded
+                for user_id, recorded in self._last_recorded.items()
+                if now - recorded < interval
+            }
+
+    def drain(self):
+        """
+            Atomically take every buffered {user_id: datetime}
+        """
+        client = self._redis_client()
+        if client is not None:
+            key = cache.make_key(self.DIRTY_KEY)
+            pipe = client.pipeline()
+            pipe.hgetall(key)
+            pipe.delete(key)
+            entries, _ = pipe.execute()
+            return {
+                int(user_id): datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc)
+                for user_id, timestamp in entries.items()
+            }
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        return pending
+
+    def flush(self, batch_size=500):
+        """
+            Write buffered timestamps to the database, returns the number of users
+        """
+        from freelancing.custom_auth.models import ApplicationUser, UserActivity
+
+        pending = self.drain()
+        if not pending:
+            return 0
+
+        users = [
+            ApplicationUser(pk=user_id, last_user_activity=seen_at)
+            for user_id, seen_at in pending.items()
+        ]
+        ApplicationUser.objects.bulk_update(users, ["last_user_activity"], batch_size=batch_size)
+
+        existing_user_ids = set(
+            ApplicationUser.objects.filter(pk__in=pending).values_list("pk", flat=True)
+        )
+        UserActivity.objects.bulk_create(
+            [UserActivity(user_id=user_id) for user_id in existing_user_ids],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # last_activity is auto_now, which save() and bulk_create() would stamp
+        # with the flush time; QuerySet.update() writes the buffered timestamps
+        user_ids = sorted(existing_user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            UserActivity.objects.filter(user_id__in=chunk).update(
+                last_activity=Case(
+                    *[When(user_id=user_id, then=Value(pending[user_id])) for user_id in chunk],
+                    output_field=DateTimeField(),
+                )
+            )
+        return len(pending)
+
+
+activity_tracker = UserActivityTracker()
@@ -1,18 +1,23 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.db.models import BooleanField, Case, Value, When
+from django.template.response import TemplateResponse
 
 from freelancing.custom_auth.models import (ApplicationUser, MultiToken,
                                             UserActivity, CustomPermission,
-                                            MerchantProfile, Wallet, Category, WalletHistory, SiteSetting)
+                                            MerchantProfile, Wallet, Category, WalletHistory, SiteSetting,
+                                            WalletSnapshot, EmailOutbox,
+                                            APIRequestLog)
 
 # Register your models here.
 # admin.site.register(MultiToken)
 # admin.site.register()
 admin.site.register(UserActivity)
 admin.site.register(MerchantProfile)
-admin.site.register(Wallet)
 admin.site.register(Category)
 admin.site.register(WalletHistory)
+admin.site.register(WalletSnapshot)
 admin.site.register(SiteSetting)
 
 from datetime import timedelta
@@ -170,4 +175,75 @@ class UserAdmin(UserAdmin):
     is_online.admin_order_field = "is_online"
 
 
-admin.site.register(CustomPermission)
\ No newline at end of file
+admin.site.register(CustomPermission)
+
+
+class WalletBulkTransferForm(forms.Form):
+    amount = forms.DecimalField(
+        max_digits=12, decimal_places=2,
+        help_text="Positive to credit, negative to debit every selected wallet",
+    )
+    note = forms.CharField(max_length=255, required=False)
+    ref_id = forms.CharField(max_length=100, required=False)
+
+
+@admin.register(Wallet)
+class WalletAdmin(admin.ModelAdmin):
+    list_display = ("user", "balance", "update_time")
+    search_fields = ("user__email", "user__phone", "user__fullname")
+    list_select_related = ("user",)
+    actions = ("bulk_transfer",)
+
+    @admin.action(description="Credit / debit selected wallets")
+    def bulk_transfer(self, request, queryset):
+        form = WalletBulkTransferForm(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            amount = form.cleaned_data["amount"]
+            note = form.cleaned_data["note"] or None
+            ref_id = form.cleaned_data["ref_id"] or None
+            result = Wallet.objects.bulk_apply(
+                (user_id, amount, note, ref_id)
+                for user_id in queryset.values_list("user_id", flat=True)
+            )
+            self.message_user(request, f"Applied ₹{amount} to {result['applied']} wallet(s)")
+            for entry, reason in result["failed"]:
+                self.message_user(request, f"User {entry[0]}: {reason}", level=messages.WARNING)
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Credit / debit selected wallets",
+            "opts": self.model._meta,
+            "form": form,
+            "queryset": queryset,
+            "action_checkbox_name": ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, "admin/custom_auth/wallet/bulk_transfer.html", context)
+
+
+@admin.register(APIRequestLog)
+class APIRequestLogAdmin(admin.ModelAdmin):
+    list_display = ('added_on', 'method', 'path', 'status_code', 'execution_time', 'user_id', 'client_ip')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    date_hierarchy = 'added_on'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    # Bodies of pending rows can hold OTPs and passwords, so they are never shown
+    list_display = ('subject', 'to', 'template_name', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'template_name')
+    exclude = ('body_text', 'body_html')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -23,12 +23,14 @@ from rest_framework.response import Response
 from rest_framework.serializers import BaseSerializer
 from rest_framework.status import HTTP_200_OK
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError # type: ignore
+from rest_framework_simplejwt.settings import api_settings as jwt_settings # type: ignore
 from rest_framework_simplejwt.tokens import RefreshToken # type: ignore
-from templated_email import send_templated_mail
 
 from freelancing.custom_auth.models import (ApplicationUser, LoginOtp, CustomBlacklistedToken,
                                          CustomPermission, Wallet, MerchantProfile, Category,
                                         WalletHistory)
+from freelancing.custom_auth.outbox import queue_templated_mail
 from freelancing.custom_auth.permissions import IsSelf
 from freelancing.custom_auth.serializers import (BaseUserSerializer,
                                                 ChangePasswordSerializer,
@@ -46,14 +48,14 @@ from freelancing.registrations.serializers import CheckOtp
 from freelancing.utils.permissions import IsAPIKEYAuthenticated, IsReadAction, IsSuperAdminUser
 from freelancing.utils.serializers import add_serializer_mixin
 
-from rest_framework_simplejwt.authentication import JWTAuthentication # type: ignore
+from freelancing.custom_auth.auth_backends.authentication import CachedJWTAuthentication
 User = get_user_model()
 
 
 class UserAuthViewSet(viewsets.ViewSet):
     NEW_TOKEN_HEADER = "X-Token"
     permission_classes = (permissions.IsAuthenticated,)
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     @classmethod
     def get_success_headers(cls, user):
         """
@@ -135,45 +137,29 @@ class UserAuthViewSet(viewsets.ViewSet):
     def classic_auth(self, request, *args, **kwargs):
         return self._auth(request, *args, for_agent=False, **kwargs)
 
-    # @action(methods=["post"], detail=False)
-    # def logout(self, request, *args, **kwargs):
-
-    #     if 'refresh' not in request.data:
-    #         raise ValidationError(_('refresh field is required.'))
-
-    #     if request.user.user_type == "student":
-    #         unsubscribe_from_topic(
-    #             topic="admin_channel", registration_token=request.user.device_token
-    #         )
-    #         user = request.user
-    #         user.device_token = None
-    #         user.save()
-    #     # self.request.auth.delete()
-
-    #     try:
-    #         refresh_token = request.data.get("refresh")
-    #         token = RefreshToken(refresh_token)
-    #         token.blacklist()
-
-    #         # Extract and blacklist the access token from the Authorization header
-    #         auth_header = request.headers.get('Authorization')
-    #         if not auth_header:
-    #             raise ValidationError("Authorization header is required")
-    #         access_token = auth_header.split()[1]
-    #         CustomBlacklistedToken.objects.create(token=access_token)
-
-    #         return Response({"data": "Logout Successful! Thank you for using our services. "
-    #                                  "Have a great day!", "success": "true"}, status=status.HTTP_200_OK)
-    #     except Exception as e:
-    #         raise ValidationError(_(str(e)))
+    @action(methods=["post"], detail=False, permission_classes=[permissions.IsAuthenticated,
+                                                                IsAPIKEYAuthenticated],
+            url_name="logout", url_path="logout")
+    def logout(self, request, *args, **kwargs):
+        """
+            Revoke the access token used for this request and, when `refresh`
+            is given, blacklist that refresh token so it cannot mint new ones
+        """
+        refresh_token = request.data.get("refresh")
+        if refresh_token:
+            try:
+                refresh = RefreshToken(refresh_token)
+            except TokenError as e:
+                raise ValidationError(_(str(e)))
+            if str(refresh.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                raise ValidationError(_("Refresh token does not belong to this user."))
+            refresh.blacklist()
 
-    #     # if you want delete multiple token
-    #     # if request.user.tokens.count() > 1:
-    #     #     self.request.auth.delete()
-    #     # else:
-    #     #     request.user.tokens.all().delete()
+        # Rejected by TokenBlacklistMiddleware from the next request on, in every worker
+        CustomBlacklistedToken.blacklist(request.auth)
 
-    #     # unsubscribe_from_topic(topic="admin_channel", registration_token=request.user.device_token)
+        return Response({"data": "Logout Successful! Thank you for using our services. "
+                                 "Have a great day!", "success": "true"}, status=status.HTTP_200_OK)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -183,7 +169,7 @@ class UserViewSet(viewsets.ModelViewSet):
         IsAPIKEYAuthenticated,
         # IsReadAction | IsSelf,
     ]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     # lookup_field = "uuid"
     filter_backends = (DjangoFilterBackend, SearchFilter)
     search_fields = ["fullname"]
@@ -336,7 +322,7 @@ class UserViewSet(viewsets.ModelViewSet):
         # forget_password_otp(user, otp)
         site = get_current_site(request)
 
-        send_templated_mail(
+        queue_templated_mail(
             template_name="user_password_reset",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
@@ -408,7 +394,7 @@ class UserViewSet(viewsets.ModelViewSet):
         # send mail
         site = get_current_site(request)
 
-        send_templated_mail(
+        queue_templated_mail(
             template_name="user_password_reset",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
@@ -447,7 +433,7 @@ class CustomPermissionViewSet(viewsets.ModelViewSet):
     queryset = CustomPermission.objects.all()
     serializer_class = CustomPermissionSerializer
     permission_classes = [permissions.IsAuthenticated, IsAPIKEYAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
 
 
@@ -487,7 +473,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         permissions.IsAuthenticated,
         IsAPIKEYAuthenticated,
     ]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     filter_backends = (DjangoFilterBackend, SearchFilter)
 
 # Create your views here.
@@ -498,7 +484,7 @@ class MerchantProfileViewSet(viewsets.ModelViewSet):
         permissions.IsAuthenticated,
         IsAPIKEYAuthenticated,
     ]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     filter_backends = (DjangoFilterBackend, SearchFilter)
     http_method_names = ['get', 'post']
     # search_fields = ["user__phone"]
@@ -557,7 +543,7 @@ class WalletViewSet(viewsets.ModelViewSet):
         IsAPIKEYAuthenticated,
     ]
     http_method_names = ['get']
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     filter_backends = (DjangoFilterBackend, SearchFilter)
 
     def get_queryset(self):
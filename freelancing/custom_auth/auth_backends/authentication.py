@@ -1,7 +1,34 @@
+from django.utils.encoding import force_bytes
 from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication # type: ignore
 
 from freelancing.custom_auth.models import MultiToken
 
 
 class MultiTokenAuthentication(TokenAuthentication):
     model = MultiToken
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+        JWT authentication that reuses the access token already decoded by
+        TokenBlacklistMiddleware instead of decoding it a second time
+    """
+
+    def authenticate(self, request):
+        validated_token = getattr(request, "validated_token", None)
+        if validated_token is None:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        if force_bytes(validated_token.token) != raw_token:
+            return super().authenticate(request)
+
+        return self.get_user(validated_token), validated_token
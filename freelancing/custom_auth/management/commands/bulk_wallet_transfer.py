@@ -0,0 +1,55 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from freelancing.custom_auth.models import Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        'Credit or debit many wallets from a CSV file with the columns '
+        'user_id,amount,note,ref_id (negative amounts are debits)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of entries applied per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and report without saving anything',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='') as f:
+                entries = [
+                    (int(row['user_id']), Decimal(row['amount']), row.get('note') or None, row.get('ref_id') or None)
+                    for row in csv.DictReader(f)
+                ]
+        except (OSError, KeyError, ValueError, InvalidOperation) as e:
+            raise CommandError(f'Could not read {options["csv_file"]}: {e}')
+
+        if options['dry_run']:
+            with transaction.atomic():
+                result = Wallet.objects.bulk_apply(entries, batch_size=options['batch_size'])
+                transaction.set_rollback(True)
+        else:
+            result = Wallet.objects.bulk_apply(entries, batch_size=options['batch_size'])
+
+        for entry, reason in result['failed']:
+            self.stdout.write(self.style.WARNING(f'Skipped {entry}: {reason}'))
+
+        prefix = 'DRY RUN: Would apply' if options['dry_run'] else 'Applied'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{prefix} {result["applied"]} entries, {len(result["failed"])} skipped'
+            )
+        )
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from freelancing.custom_auth.models import Wallet, WalletSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Compare every wallet balance with its ledger (latest snapshot + later history)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Reset mismatched balances to the ledger balance',
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Take fresh snapshots after checking',
+        )
+
+    def fix_wallet(self, wallet_id):
+        """
+            Reset one wallet to its ledger balance, recomputed under the wallet
+            row lock so a credit/debit committed since the check is not lost.
+            Returns the new balance, or None when the wallet no longer differs.
+        """
+        with transaction.atomic():
+            # Credits and debits update the wallet row, so this waits for any in flight
+            list(Wallet.objects.select_for_update().filter(pk=wallet_id).values_list('pk', flat=True))
+            wallet = (
+                Wallet.objects.with_ledger_balance()
+                .filter(pk=wallet_id)
+                .values('balance', 'ledger_balance')
+                .first()
+            )
+            if wallet is None or wallet['balance'] == wallet['ledger_balance']:
+                return None
+            Wallet.objects.filter(pk=wallet_id).update(balance=wallet['ledger_balance'])
+            return wallet['ledger_balance']
+
+    def handle(self, *args, **options):
+        mismatched = (
+            Wallet.objects.with_ledger_balance()
+            .exclude(balance=models.F('ledger_balance'))
+            .values_list('id', 'balance', 'ledger_balance')
+        )
+        count = 0
+        for wallet_id, balance, ledger_balance in mismatched.iterator():
+            count += 1
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Wallet {wallet_id}: balance ₹{balance}, ledger ₹{ledger_balance}'
+                )
+            )
+            if options['fix'] and self.fix_wallet(wallet_id) is None:
+                self.stdout.write(f'Wallet {wallet_id}: matches the ledger now, left unchanged')
+
+        if count:
+            action = 'fixed' if options['fix'] else 'found'
+            self.stdout.write(self.style.ERROR(f'{count} mismatched wallet(s) {action}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All wallet balances match the ledger'))
+
+        if options['snapshot']:
+            created = WalletSnapshot.take_snapshots()
+            self.stdout.write(self.style.SUCCESS(f'Took {created} wallet snapshot(s)'))
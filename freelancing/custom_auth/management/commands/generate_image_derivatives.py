@@ -0,0 +1,53 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from freelancing.custom_auth.tasks import generate_image_derivatives
+from freelancing.utils.images import DERIVATIVE_FIELDS, generate_derivatives, stale_fields
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or outdated image derivatives for existing uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=sorted(DERIVATIVE_FIELDS),
+            action='append',
+            help='Only process this model (repeatable)',
+        )
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Render in this process instead of queueing Celery tasks',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows read per query',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for label in options['model'] or sorted(DERIVATIVE_FIELDS):
+            model = apps.get_model(label)
+            fields = DERIVATIVE_FIELDS[label]
+            has_image = Q()
+            for field_name in fields:
+                has_image |= ~Q(**{field_name: ''}) & Q(**{f'{field_name}__isnull': False})
+            queryset = model.objects.filter(has_image).only('pk', 'image_derivatives', *fields)
+
+            count = 0
+            for instance in queryset.iterator(chunk_size=options['batch_size']):
+                if not stale_fields(instance):
+                    continue
+                if options['sync']:
+                    generate_derivatives(label, instance.pk)
+                else:
+                    generate_image_derivatives.delay(label, instance.pk)
+                count += 1
+            total += count
+            self.stdout.write(f'{label}: {count} row(s) {"processed" if options["sync"] else "queued"}')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} row(s) with outdated derivatives'))
@@ -1,15 +1,18 @@
 # middleware.py
 import datetime
+import time as time_module
 from datetime import datetime, time
-from .models import CustomBlacklistedToken
+from .token_revocation import revoked_tokens
 
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 # import pytz
 from django.http import JsonResponse
-from django.utils import timezone
 
-from .models import UserActivity
+from .activity import activity_tracker
+from . import request_log
 
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 
 
@@ -20,31 +23,57 @@ class UpdateUserActivityMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
 
-        if request.user.is_authenticated:
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
             try:
-                user_activity, created = UserActivity.objects.get_or_create(
-                    user=request.user
-                )
-                user_activity.last_activity = timezone.now()
-                user_activity.save()
-            except:
+                # Throttled and buffered; flushed by the flush_user_activity task
+                activity_tracker.touch(user.pk)
+            except Exception:
                 pass
 
         return response
 
 
+class RequestLogMiddleware:
+    """
+        Logs API requests without writing on the request path: sampled
+        requests (and every server error) are queued for the background
+        writer in freelancing.custom_auth.request_log.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "API_LOG_ENABLED", True):
+            return self.get_response(request)
+
+        rate = request_log.sample_rate(request.path)
+        sampled = request_log.should_sample(rate)
+        request_body = request_log.read_body(request) if sampled else b""
+        started = time_module.monotonic()
+        response = self.get_response(request)
+
+        if sampled or response.status_code >= 500:
+            try:
+                request_log.capture(request, response, started, rate, request_body)
+            except Exception:
+                pass
+        return response
+
+
 class TokenBlacklistMiddleware(MiddlewareMixin):
     def process_request(self, request):
         auth = request.headers.get('Authorization', None)
         if auth:
             try:
                 token_str = auth.split()[1]
-                if CustomBlacklistedToken.objects.filter(token=token_str).exists():
+                # Validate and decode the token once (signature and expiry);
+                # CachedJWTAuthentication reuses it from the request
+                token = AccessToken(token_str)
+                if revoked_tokens.is_revoked(token.get(api_settings.JTI_CLAIM)):
                     return JsonResponse({"errors": "Token is blacklisted",
                                          "success": "false"}, status=401)
-                # Validate and decode the token to check expiry and other validations
-                token = AccessToken(token_str)
-                token.check_exp()
+                request.validated_token = token
             except Exception as e:
                 return JsonResponse({"errors": str(e), "success": "false"}, status=401)
 
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 10:03
+
+import base64
+import json
+
+from django.db import migrations, models
+
+
+def _read_jti(token):
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get("jti")
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def populate_jti(apps, schema_editor):
+    CustomBlacklistedToken = apps.get_model("custom_auth", "CustomBlacklistedToken")
+    seen = set()
+    for blacklisted in CustomBlacklistedToken.objects.filter(jti__isnull=True).iterator():
+        jti = _read_jti(blacklisted.token)
+        if jti and jti not in seen:
+            seen.add(jti)
+            blacklisted.jti = jti
+            blacklisted.save(update_fields=["jti"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "custom_auth",
+            "0009_remove_wallet_content_type_remove_wallet_object_id_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customblacklistedtoken",
+            name="jti",
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_jti, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 10:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def create_opening_snapshots(apps, schema_editor):
+    """
+    Wallets created before the ledger was complete have balance that is not
+    backed by history (e.g. the 1000.00 sign-up credit). Record it as an
+    opening snapshot taken before any history so the ledger balances.
+    """
+    Wallet = apps.get_model("custom_auth", "Wallet")
+    WalletSnapshot = apps.get_model("custom_auth", "WalletSnapshot")
+    history_totals = dict(
+        Wallet.objects.annotate(total=models.Sum("histories__amount")).values_list(
+            "id", "total"
+        )
+    )
+    WalletSnapshot.objects.bulk_create(
+        [
+            WalletSnapshot(
+                wallet_id=wallet_id,
+                balance=balance - (history_totals.get(wallet_id) or Decimal("0.00")),
+                last_history_id=0,
+            )
+            for wallet_id, balance in Wallet.objects.values_list("id", "balance")
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0010_customblacklistedtoken_jti"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                ("is_delete", models.BooleanField(default=False)),
+                ("create_time", models.DateTimeField(auto_now_add=True)),
+                ("update_time", models.DateTimeField(auto_now=True)),
+                ("balance", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("last_history_id", models.PositiveBigIntegerField(default=0)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="custom_auth.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-last_history_id"],
+            },
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 10:14
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0011_walletsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="applicationuser",
+            index=models.Index(
+                django.db.models.functions.text.Upper("email"),
+                condition=models.Q(("is_delete", False)),
+                name="user_live_email_upper_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loginotp",
+            index=models.Index(
+                fields=["user_mobile", "-expiration_time"],
+                name="loginotp_mobile_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wallethistory",
+            index=models.Index(
+                fields=["wallet", "-create_time", "-id"],
+                name="wallethistory_wallet_time_idx",
+            ),
+        ),
+    ]
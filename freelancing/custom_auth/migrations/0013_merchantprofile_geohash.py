@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+# Frozen copy of freelancing.utils.geo.encode as it was when this migration
+# was written, so later changes to the app's encoder cannot alter it
+GEOHASH_AXIS_BITS = 26
+
+
+def _quantise(value, low, high, bits):
+    cells = 1 << bits
+    index = int((value - low) / (high - low) * cells)
+    return min(max(index, 0), cells - 1)
+
+
+def _interleave(lng_index, lat_index, bits):
+    code = 0
+    for bit in range(bits - 1, -1, -1):
+        code = (code << 2) | (((lng_index >> bit) & 1) << 1) | ((lat_index >> bit) & 1)
+    return code
+
+
+def encode(latitude, longitude):
+    lat_index = _quantise(float(latitude), -90.0, 90.0, GEOHASH_AXIS_BITS)
+    lng_index = _quantise(float(longitude), -180.0, 180.0, GEOHASH_AXIS_BITS)
+    return _interleave(lng_index, lat_index, GEOHASH_AXIS_BITS)
+
+
+def populate_geohash(apps, schema_editor):
+    MerchantProfile = apps.get_model("custom_auth", "MerchantProfile")
+    merchants = list(
+        MerchantProfile.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).only("id", "latitude", "longitude")
+    )
+    for merchant in merchants:
+        merchant.geohash = encode(merchant.latitude, merchant.longitude)
+    MerchantProfile.objects.bulk_update(merchants, ["geohash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0012_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="merchantprofile",
+            name="geohash",
+            field=models.BigIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0014_emailoutbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="applicationuser",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="merchantprofile",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
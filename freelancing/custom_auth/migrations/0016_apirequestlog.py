@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0015_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIRequestLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("added_on", models.DateTimeField(db_index=True)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=1024)),
+                ("status_code", models.PositiveSmallIntegerField(db_index=True)),
+                (
+                    "execution_time",
+                    models.FloatField(
+                        help_text="Milliseconds spent in the view and inner middleware"
+                    ),
+                ),
+                ("user_id", models.BigIntegerField(blank=True, null=True)),
+                ("client_ip", models.CharField(blank=True, default="", max_length=50)),
+                ("headers", models.JSONField(blank=True, default=dict)),
+                ("request_body", models.TextField(blank=True, default="")),
+                ("response_body", models.TextField(blank=True, default="")),
+                ("sample_rate", models.FloatField(default=1.0)),
+            ],
+            options={
+                "verbose_name": "API Log",
+                "verbose_name_plural": "API Logs",
+                "ordering": ("-added_on",),
+            },
+        ),
+    ]
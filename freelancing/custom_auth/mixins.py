@@ -14,6 +14,8 @@ class UserPhotoMixin(models.Model):
 
     width_photo = models.PositiveSmallIntegerField(blank=True, null=True)
     height_photo = models.PositiveSmallIntegerField(blank=True, null=True)
+    # Resized copies of the photo, see freelancing.utils.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         abstract = True
@@ -1,17 +1,21 @@
+import time
 import uuid as uuid
+from datetime import timedelta
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from django.utils.encoding import force_bytes
+from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from decimal import Decimal
+from django.db.models.functions import Coalesce, Upper
 from django.core.exceptions import ValidationError
 from model_utils import Choices
 from phonenumber_field.modelfields import PhoneNumberField
@@ -21,6 +25,7 @@ from rest_framework.authtoken.models import Token
 from freelancing.custom_auth.managers import ApplicationUserManager
 from freelancing.custom_auth.mixins import UserPhotoMixin
 
+from freelancing.utils import geo
 from freelancing.utils.utils import set_otp_expiration_time, set_otp_reset_expiration_time
 
 
@@ -38,11 +43,45 @@ class CustomBlacklistedToken(models.Model):
         Represent block access token of JWT
     """
     token = models.CharField(max_length=256, unique=True)
+    jti = models.CharField(max_length=255, unique=True, null=True, blank=True)
     blacklisted_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.token
 
+    def save(self, *args, **kwargs):
+        if not self.jti and self.token:
+            self.jti = self.get_jti(self.token)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def get_jti(token):
+        """Read the JTI claim of an encoded access token without verifying it"""
+        from rest_framework_simplejwt.settings import api_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        try:
+            return AccessToken(token, verify=False).get(api_settings.JTI_CLAIM)
+        except Exception:
+            return None
+
+    @classmethod
+    def blacklist(cls, token):
+        """
+            Blacklist an encoded access token or an AccessToken instance
+        """
+        from rest_framework_simplejwt.settings import api_settings
+        from rest_framework_simplejwt.tokens import Token
+
+        if isinstance(token, Token):
+            token_str = force_str(token.token) if token.token else str(token)
+            jti = token.get(api_settings.JTI_CLAIM)
+        else:
+            token_str = force_str(token)
+            jti = cls.get_jti(token_str)
+        blacklisted, _ = cls.objects.get_or_create(token=token_str, defaults={"jti": jti})
+        return blacklisted
+
 
 # Create your models here.
 class BaseModel(models.Model):
@@ -214,12 +253,18 @@ class ApplicationUser(AbstractBaseUser, UserPhotoMixin, PermissionsMixin):
     class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        indexes = [
+            # Login / password reset: email__iexact on live (not deleted) users
+            models.Index(Upper("email"), name="user_live_email_upper_idx", condition=models.Q(is_delete=False)),
+        ]
 
     def __str__(self):
         return self.email or self.first_name or self.last_name or str(self.uuid)
 
     def save(self, *args, **kwargs):
-        if self.photo and (not self.width_photo or not self.height_photo):
+        # Only a fresh upload is measured here, from the local file; stored photos
+        # get their dimensions from the derivative task instead of a storage read
+        if self.photo and not self.photo._committed and (not self.width_photo or not self.height_photo):
             self.width_photo = self.photo.width
             self.height_photo = self.photo.height
 
@@ -249,10 +294,13 @@ class ApplicationUser(AbstractBaseUser, UserPhotoMixin, PermissionsMixin):
             self.last_name = fullname_parts[0]
 
     def update_last_activity(self):
+        from freelancing.custom_auth.activity import activity_tracker
+
         now = timezone.now()
 
         self.last_user_activity = now
-        self.save(update_fields=("last_user_activity", "last_modified"))
+        # Buffered and written in bulk instead of one UPDATE per call
+        activity_tracker.touch(self.pk, when=now)
     
     def clean(self):
         super().clean()
@@ -297,17 +345,189 @@ class MerchantProfile(BaseModel):
 
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Integer geohash of (latitude, longitude), kept in sync on save; see freelancing.utils.geo
+    geohash = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True)
 
     logo = models.ImageField(upload_to="merchant/logo/", null=True, blank=True)
     banner_image = models.ImageField(upload_to="merchant/banner/", null=True, blank=True)
+    # Resized copies of logo/banner_image, see freelancing.utils.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
     def __str__(self):
         return f"{self.business_name} ({self.user.email})"
 
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def nearby(cls, latitude, longitude, radius_km):
+        """
+            Merchants within `radius_km` of the point, nearest first, as a list of
+            (merchant_id, distance_km). Candidates come from indexed geohash range
+            scans; the exact haversine distance decides the final set.
+        """
+        ranges = geo.covering_ranges(latitude, longitude, radius_km)
+        cell_filter = models.Q()
+        for low, high in ranges:
+            cell_filter |= models.Q(geohash__range=(low, high))
+        candidates = cls.objects.filter(cell_filter, is_active=True).values_list("id", "latitude", "longitude")
+
+        results = []
+        for merchant_id, merchant_lat, merchant_lng in candidates:
+            distance = geo.haversine_km(latitude, longitude, merchant_lat, merchant_lng)
+            if distance <= radius_km:
+                results.append((merchant_id, distance))
+        results.sort(key=lambda item: item[1])
+        return results
+
+
+class WalletQuerySet(models.QuerySet):
+    def with_ledger_balance(self, settled_before=None):
+        """
+            Annotate `ledger_balance`: the latest snapshot balance plus every
+            history entry written after it, i.e. the balance according to the
+            append-only ledger rather than the `balance` column.
+
+            With `settled_before`, only history created before that time is
+            counted (and `last_history_id` is the newest such entry)
+        """
+        latest_snapshot = WalletSnapshot.objects.filter(
+            wallet=models.OuterRef("pk")
+        ).order_by("-last_history_id")
+        history = WalletHistory.objects.filter(wallet=models.OuterRef("pk"))
+        if settled_before is not None:
+            history = history.filter(create_time__lt=settled_before)
+        history_since_snapshot = (
+            history.filter(id__gt=models.OuterRef("snapshot_history_id"))
+            .order_by()
+            .values("wallet")
+            .annotate(total=models.Sum("amount"))
+            .values("total")
+        )
+        return self.annotate(
+            snapshot_history_id=Coalesce(
+                models.Subquery(latest_snapshot.values("last_history_id")[:1]),
+                models.Value(0),
+                output_field=models.BigIntegerField(),
+            ),
+            snapshot_balance=Coalesce(
+                models.Subquery(latest_snapshot.values("balance")[:1]),
+                models.Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            history_total=Coalesce(
+                models.Subquery(history_since_snapshot),
+                models.Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            last_history_id=models.Subquery(history.order_by("-id").values("id")[:1]),
+        ).annotate(
+            ledger_balance=models.F("snapshot_balance") + models.F("history_total")
+        )
+
+    def bulk_apply(self, entries, batch_size=500):
+        """
+            Credit (positive amount) or debit (negative amount) many wallets at once.
+
+            `entries` is an iterable of (user_id, amount, note, ref_id). Each chunk
+            of `batch_size` entries runs in its own transaction: the chunk's wallets
+            are locked with one SELECT, balances move with a single
+            UPDATE ... SET balance = balance + CASE ... END, and the history is
+            written with bulk_create. Entries for a user whose wallet is missing or
+            would go negative are skipped and returned in `failed` as
+            (entry, reason); the rest of the chunk is still applied.
+        """
+        entries = list(entries)
+        applied = 0
+        failed = []
+        for start in range(0, len(entries), batch_size):
+            chunk = []
+            for entry in entries[start:start + batch_size]:
+                user_id, amount, note, ref_id = entry
+                amount = Decimal(str(amount))
+                if not amount:
+                    failed.append((entry, "Amount must not be zero"))
+                    continue
+                chunk.append((entry, user_id, amount, note, ref_id))
+            if not chunk:
+                continue
+
+            with transaction.atomic():
+                wallets = {
+                    wallet.user_id: wallet
+                    for wallet in self.select_for_update()
+                    .filter(user_id__in={item[1] for item in chunk})
+                    .only("id", "user_id", "balance")
+                    .order_by("pk")
+                }
+                deltas = {}
+                for _, user_id, amount, _, _ in chunk:
+                    deltas[user_id] = deltas.get(user_id, Decimal("0.00")) + amount
+
+                rejected = {}
+                for user_id, delta in deltas.items():
+                    wallet = wallets.get(user_id)
+                    if wallet is None:
+                        rejected[user_id] = "User wallet not found"
+                    elif wallet.balance + delta < 0:
+                        rejected[user_id] = (
+                            f"Insufficient balance. Required: ₹{-delta}, Available: ₹{wallet.balance}"
+                        )
+
+                histories = []
+                for entry, user_id, amount, note, ref_id in chunk:
+                    if user_id in rejected:
+                        failed.append((entry, rejected[user_id]))
+                        continue
+                    histories.append(
+                        WalletHistory(
+                            wallet=wallets[user_id],
+                            amount=amount,
+                            transaction_type='credit' if amount > 0 else 'debit',
+                            reference_note=note,
+                            reference_id=ref_id,
+                        )
+                    )
+                if not histories:
+                    continue
+
+                wallet_deltas = {
+                    wallets[user_id].pk: delta
+                    for user_id, delta in deltas.items()
+                    if user_id not in rejected
+                }
+                self.model.objects.filter(pk__in=wallet_deltas).update(
+                    balance=models.F("balance") + models.Case(
+                        *[models.When(pk=pk, then=models.Value(delta)) for pk, delta in wallet_deltas.items()],
+                        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                    ),
+                    update_time=timezone.now(),
+                )
+                WalletHistory.objects.bulk_create(histories, batch_size=batch_size)
+                applied += len(histories)
+        return {"applied": applied, "failed": failed}
+
 
 class Wallet(BaseModel):
+    """
+        Points wallet.
+
+        WalletHistory is the append-only ledger of every movement; `balance`
+        is maintained next to it with single atomic F() updates so concurrent
+        movements never rewrite the whole row. Use Wallet.objects.bulk_apply()
+        to move points for many users at once. WalletSnapshot rows record the
+        ledger balance periodically, so a balance can be rebuilt or audited
+        (see the check_wallet_ledger command) without scanning all history.
+    """
     user = models.OneToOneField(ApplicationUser, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
 
+    objects = WalletQuerySet.as_manager()
+
     def __str__(self):
         if self.user:
             return f"Wallet of {self.user.fullname} - ₹{self.balance}"
@@ -315,10 +535,14 @@ class Wallet(BaseModel):
             return f"Orphaned Wallet - ₹{self.balance}"
 
     def deduct(self, amount: Decimal, note=None, ref_id=None):
-        if self.balance < amount:
+        # Conditional UPDATE so the balance can never go negative under concurrency
+        updated = Wallet.objects.filter(pk=self.pk, balance__gte=amount).update(
+            balance=models.F("balance") - amount, update_time=timezone.now()
+        )
+        if not updated:
+            self.refresh_from_db(fields=["balance"])
             raise ValidationError("Insufficient balance in wallet.")
-        self.balance -= amount
-        self.save()
+        self.refresh_from_db(fields=["balance", "update_time"])
         WalletHistory.objects.create(
             wallet=self,
             amount=-amount,
@@ -327,9 +551,37 @@ class Wallet(BaseModel):
             reference_id=ref_id
         )
 
+    @classmethod
+    def debit_for_user(cls, user, amount: Decimal, note=None, ref_id=None):
+        """
+            Debit a user's wallet with one conditional
+            UPDATE ... SET balance = balance - amount WHERE balance >= amount
+            instead of locking and reading the row first.
+            Must run inside a transaction; returns the wallet with its new balance.
+        """
+        updated = cls.objects.filter(user=user, balance__gte=amount).update(
+            balance=models.F("balance") - amount, update_time=timezone.now()
+        )
+        wallet = cls.objects.only("id", "balance").filter(user=user).first()
+        if wallet is None:
+            raise ValidationError("User wallet not found")
+        if not updated:
+            raise ValidationError(
+                f"Insufficient balance. Required: ₹{amount}, Available: ₹{wallet.balance}"
+            )
+        WalletHistory.objects.create(
+            wallet=wallet,
+            amount=-amount,
+            transaction_type='debit',
+            reference_note=note,
+            reference_id=ref_id
+        )
+        return wallet
+
     def credit(self, amount: Decimal, note=None, ref_id=None):
-        self.balance += amount
-        self.save()
+        self.balance = models.F("balance") + amount
+        self.save(update_fields=["balance", "update_time"])
+        self.refresh_from_db(fields=["balance"])
         WalletHistory.objects.create(
             wallet=self,
             amount=amount,
@@ -337,6 +589,12 @@ class Wallet(BaseModel):
             reference_note=note,
             reference_id=ref_id
         )
+
+    def get_ledger_balance(self):
+        """Balance according to the latest snapshot plus the history after it"""
+        return Wallet.objects.with_ledger_balance().get(pk=self.pk).ledger_balance
+
+
 class WalletHistory(BaseModel):
     TRANSACTION_CHOICES = (
         ('credit', 'Credit'),
@@ -349,9 +607,65 @@ class WalletHistory(BaseModel):
     reference_note = models.CharField(max_length=255, null=True, blank=True)
     reference_id = models.CharField(max_length=100, null=True, blank=True)  # e.g. Voucher ID or Order ID
     meta = models.JSONField(null=True, blank=True) 
+
+    class Meta:
+        indexes = [
+            # Wallet history/summary, newest first, and keyset pages on (create_time, id)
+            models.Index(fields=["wallet", "-create_time", "-id"], name="wallethistory_wallet_time_idx"),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type.title()} ₹{self.amount}"
 
+
+class WalletSnapshot(BaseModel):
+    """
+        Ledger balance of a wallet including every WalletHistory entry up to
+        `last_history_id`
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_history_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-last_history_id']
+
+    def __str__(self):
+        return f"Snapshot of wallet {self.wallet_id} - ₹{self.balance}"
+
+    @classmethod
+    def take_snapshots(cls, batch_size=1000):
+        """
+            Snapshot every wallet that has history after its latest snapshot.
+            Returns the number of snapshots written.
+
+            History ids are allocated before commit, so an entry with a lower
+            id can still commit after a newer one is visible. Only history
+            older than WALLET_SNAPSHOT_SETTLE_SECONDS is snapshotted, so an
+            in-flight entry never ends up below the snapshot watermark.
+        """
+        settled_before = timezone.now() - timedelta(
+            seconds=getattr(settings, "WALLET_SNAPSHOT_SETTLE_SECONDS", 300)
+        )
+        wallets = (
+            Wallet.objects.with_ledger_balance(settled_before=settled_before)
+            .filter(last_history_id__gt=models.F("snapshot_history_id"))
+            .values_list("id", "ledger_balance", "last_history_id")
+        )
+        created = 0
+        batch = []
+        for wallet_id, ledger_balance, last_history_id in wallets.iterator(chunk_size=batch_size):
+            batch.append(cls(wallet_id=wallet_id, balance=ledger_balance, last_history_id=last_history_id))
+            if len(batch) >= batch_size:
+                cls.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            cls.objects.bulk_create(batch)
+            created += len(batch)
+        return created
+
+
 class LoginOtp(BaseModel):
     """
         Represent check otp when you will login with phone number
@@ -360,6 +674,11 @@ class LoginOtp(BaseModel):
     otp = models.IntegerField()
     expiration_time = models.DateTimeField(default=set_otp_reset_expiration_time)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_mobile", "-expiration_time"], name="loginotp_mobile_expiry_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.expiration_time:
             self.expiration_time = set_otp_expiration_time()
@@ -397,16 +716,143 @@ class CustomPermission(BaseModel):
         return self.name
 
 
+# Per-process copy of site settings: {key: (value, expires_at)}. A value of
+# None records that the key does not exist, so defaults are cached too.
+_site_setting_local_cache = {}
+
+
 class SiteSetting(BaseModel):
+    CACHE_KEY_PREFIX = "site_setting:"
+
     key = models.CharField(max_length=100, unique=True)
     value = models.CharField(max_length=255)
 
     def __str__(self):
         return f"{self.key}: {self.value}"
 
+    @classmethod
+    def _cache_key(cls, key):
+        return f"{cls.CACHE_KEY_PREFIX}{key}"
+
     @staticmethod
     def get_value(key, default=None):
-        try:
-            return SiteSetting.objects.get(key=key).value
-        except SiteSetting.DoesNotExist:
-            return default
+        return SiteSetting.get_many([key], default=default)[key]
+
+    @classmethod
+    def get_many(cls, keys, default=None):
+        """
+        Return {key: value} for the given keys, falling back to `default` for
+        keys that do not exist.
+
+        Lookups go through the per-process dictionary first, then the shared
+        cache and only then the database, with one query for all misses.
+        Local entries live for SITE_SETTING_LOCAL_CACHE_TIMEOUT seconds, which
+        bounds how long another worker can serve a stale value after a change.
+        """
+        now = time.monotonic()
+        values = {}
+        missing = []
+        for key in keys:
+            entry = _site_setting_local_cache.get(key)
+            if entry is not None and entry[1] > now:
+                values[key] = entry[0]
+            else:
+                missing.append(key)
+
+        if missing:
+            shared = cache.get_many([cls._cache_key(key) for key in missing])
+            not_cached = []
+            for key in missing:
+                cache_key = cls._cache_key(key)
+                if cache_key in shared:
+                    values[key] = shared[cache_key]
+                else:
+                    not_cached.append(key)
+
+            if not_cached:
+                found = dict(
+                    cls.objects.filter(key__in=not_cached).values_list("key", "value")
+                )
+                fetched = {key: found.get(key) for key in not_cached}
+                cache.set_many(
+                    {cls._cache_key(key): value for key, value in fetched.items()},
+                    getattr(settings, "SITE_SETTING_CACHE_TIMEOUT", 300),
+                )
+                values.update(fetched)
+
+            expires_at = now + getattr(settings, "SITE_SETTING_LOCAL_CACHE_TIMEOUT", 30)
+            for key in missing:
+                _site_setting_local_cache[key] = (values[key], expires_at)
+
+        return {key: default if values[key] is None else values[key] for key in keys}
+
+    @classmethod
+    def invalidate_cache(cls, *keys):
+        """Drop the given keys from the shared cache and this process's copy"""
+        cache.delete_many([cls._cache_key(key) for key in keys])
+        _site_setting_local_cache.clear()
+
+
+class EmailOutbox(BaseModel):
+    """
+        Transactional email waiting to be sent. Rows are written in the
+        caller's transaction and delivered by the drain_email_outbox task,
+        so an email is only sent if the change that triggered it committed.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    template_name = models.CharField(max_length=100, blank=True, default='')
+    from_email = models.CharField(max_length=255, blank=True, default='')
+    to = models.JSONField(default=list)
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField(blank=True, default='')
+    body_html = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Drain picks pending rows that are due, oldest first
+            models.Index(
+                fields=['next_attempt_at', 'id'], name='emailoutbox_due_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class APIRequestLog(models.Model):
+    """
+        Logged API request, written in batches off the request path by
+        freelancing.custom_auth.request_log. Bodies are redacted and
+        truncated; a row stands for 1 / sample_rate requests to its path.
+    """
+    added_on = models.DateTimeField(db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=1024)
+    status_code = models.PositiveSmallIntegerField(db_index=True)
+    execution_time = models.FloatField(help_text='Milliseconds spent in the view and inner middleware')
+    # Plain id rather than a foreign key: log rows outlive users and are written in bulk
+    user_id = models.BigIntegerField(null=True, blank=True)
+    client_ip = models.CharField(max_length=50, blank=True, default='')
+    headers = models.JSONField(default=dict, blank=True)
+    request_body = models.TextField(blank=True, default='')
+    response_body = models.TextField(blank=True, default='')
+    sample_rate = models.FloatField(default=1.0)
+
+    class Meta:
+        ordering = ('-added_on',)
+        verbose_name = 'API Log'
+        verbose_name_plural = 'API Logs'
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.status_code})"
@@ -0,0 +1,131 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from templated_email import get_templated_mail
+
+from freelancing.custom_auth.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def queue_mail(to, subject, body_text="", body_html="", from_email=None, template_name=""):
+    """
+    Write an email to the outbox in the caller's transaction; it is handed to
+    the drain task once that transaction commits
+    """
+    from freelancing.custom_auth.tasks import drain_email_outbox
+
+    if isinstance(to, str):
+        to = [to]
+    email = EmailOutbox.objects.create(
+        template_name=template_name,
+        from_email=from_email or "",
+        to=list(to),
+        subject=subject[:255],
+        body_text=body_text or "",
+        body_html=body_html or "",
+    )
+    transaction.on_commit(drain_email_outbox.delay)
+    return email
+
+
+def queue_templated_mail(template_name, recipient_list, context, from_email=None):
+    """
+    Render a django-templated-email template now and queue the result.
+    Templates are compiled once per process by Django's cached template
+    loader, so only the render itself runs on the request path.
+    """
+    message = get_templated_mail(template_name, context, from_email=from_email, to=recipient_list)
+    body_text, body_html = message.body, ""
+    if message.content_subtype == "html":
+        body_text, body_html = "", message.body
+    for content, mimetype in getattr(message, "alternatives", []):
+        if mimetype == "text/html":
+            body_html = content
+    return queue_mail(
+        recipient_list, message.subject, body_text, body_html,
+        from_email=from_email, template_name=template_name,
+    )
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body_text or email.body_html,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+    if email.body_html and email.body_text:
+        message.attach_alternative(email.body_html, "text/html")
+    elif email.body_html:
+        message.content_subtype = "html"
+    return message
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def drain_outbox(batch_size=None):
+    """
+    Send due outbox rows over one reused mail connection.
+
+    Rows are claimed EMAIL_OUTBOX_BATCH_SIZE at a time with
+    SELECT ... FOR UPDATE SKIP LOCKED, so concurrent drains never send the
+    same row, and each batch commits its results before the next is claimed.
+    A failed send is retried after EMAIL_OUTBOX_RETRY_DELAY seconds, doubling
+    per attempt, and marked failed after EMAIL_OUTBOX_MAX_ATTEMPTS. Bodies of
+    sent and failed rows are cleared since they can carry OTPs and passwords.
+
+    Returns counts of sent, retried and failed rows.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    metrics = {"sent": 0, "retried": 0, "failed": 0}
+    connection = get_connection()
+    try:
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    EmailOutbox.objects.filter(status="pending", next_attempt_at__lte=timezone.now())
+                    .select_for_update(skip_locked=True)
+                    .order_by("next_attempt_at", "id")[:batch_size]
+                )
+                if not batch:
+                    break
+                for email in batch:
+                    email.attempts += 1
+                    try:
+                        # No-op while open; keeps send() from opening and closing per message
+                        connection.open()
+                        _build_message(email, connection).send()
+                    except Exception as exc:
+                        # Drop a possibly broken connection; the next send reopens it
+                        connection.close()
+                        email.last_error = str(exc)
+                        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                            email.status = "failed"
+                            email.body_text = email.body_html = ""
+                            metrics["failed"] += 1
+                            logger.error("Email %s to %s failed permanently: %s", email.pk, email.to, exc)
+                        else:
+                            email.next_attempt_at = timezone.now() + _retry_delay(email.attempts)
+                            metrics["retried"] += 1
+                    else:
+                        email.status, email.sent_at, email.last_error = "sent", timezone.now(), ""
+                        email.body_text = email.body_html = ""
+                        metrics["sent"] += 1
+                    email.update_time = timezone.now()
+                EmailOutbox.objects.bulk_update(batch, [
+                    "status", "attempts", "next_attempt_at", "last_error", "sent_at",
+                    "body_text", "body_html", "update_time",
+                ])
+            if len(batch) < batch_size:
+                break
+    finally:
+        connection.close()
+    return metrics
@@ -0,0 +1,290 @@
+"""
+Asynchronous API request logging.
+
+RequestLogMiddleware decides per request whether to log it (see
+API_LOG_SAMPLE_RATES) and puts the raw request/response on a bounded
+in-process queue. A daemon thread takes records off the queue, redacts
+secrets, truncates bodies and writes them in batches, either with
+bulk_create into APIRequestLog or as JSON lines to a rotating file
+(API_LOG_BACKEND). When the queue is full records are dropped and counted
+instead of making the request wait.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import RotatingFileHandler
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[redacted]"
+# Raw bodies above this size are not parsed for redaction, only described
+MAX_PARSED_BODY = 64 * 1024
+LOGGED_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded", "text/")
+SENSITIVE_HEADERS = {"authorization", "cookie", "api-key", "x-api-key", "proxy-authorization"}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sample_rate(path):
+    """Sample rate of the longest API_LOG_SAMPLE_RATES prefix matching the path"""
+    rates = _setting("API_LOG_SAMPLE_RATES", {})
+    matches = [prefix for prefix in rates if path.startswith(prefix)]
+    if not matches:
+        return _setting("API_LOG_DEFAULT_SAMPLE_RATE", 1.0)
+    return rates[max(matches, key=len)]
+
+
+def _is_sensitive(key):
+    # Short words must be a whole "_" part ("otp", not "otpless"); long ones may appear anywhere
+    key = str(key).lower()
+    parts = set(key.split("_"))
+    return any(
+        word in parts or (len(word) > 4 and word in key)
+        for word in _setting("API_LOG_REDACT_FIELDS", ())
+    )
+
+
+def redact(value):
+    """Copy of a decoded JSON/form value with sensitive keys masked at any depth"""
+    if isinstance(value, dict):
+        return {key: REDACTED if _is_sensitive(key) else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def _truncate(text):
+    limit = _setting("API_LOG_MAX_BODY_LENGTH", 2000)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more characters]"
+
+
+def render_body(raw, content_type):
+    """Redacted, truncated text of a request or response body"""
+    if not raw:
+        return ""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if not content_type.startswith(LOGGED_CONTENT_TYPES):
+        return f"[{len(raw)} bytes of {content_type or 'unknown content'}]"
+    if len(raw) > MAX_PARSED_BODY:
+        return f"[{len(raw)} bytes of {content_type}, too large to log]"
+    text = raw.decode("utf-8", errors="replace")
+    if content_type == "application/json":
+        try:
+            text = json.dumps(redact(json.loads(text)), ensure_ascii=False, default=str)
+        except ValueError:
+            # Not valid JSON: a password could be anywhere in it
+            return f"[{len(raw)} bytes of unparseable JSON]"
+    elif content_type == "application/x-www-form-urlencoded":
+        text = json.dumps(redact(dict(parse_qsl(text, keep_blank_values=True))), ensure_ascii=False)
+    return _truncate(text)
+
+
+def render_path(full_path):
+    """Path with sensitive query parameters masked"""
+    path, _, query = full_path.partition("?")
+    if not query:
+        return path
+    params = [
+        (key, REDACTED if _is_sensitive(key) else value)
+        for key, value in parse_qsl(query, keep_blank_values=True)
+    ]
+    return f"{path}?{urlencode(params, safe='[]')}"
+
+
+def render_headers(request_meta):
+    headers = {}
+    for key, value in request_meta.items():
+        name = (key[5:] if key.startswith("HTTP_") else key).replace("_", "-").lower()
+        headers[name] = REDACTED if name in SENSITIVE_HEADERS else value
+    return headers
+
+
+def build_record(entry):
+    """Turn a queued entry into the fields of an APIRequestLog row"""
+    return {
+        "added_on": entry["added_on"],
+        "method": entry["method"],
+        "path": render_path(entry["path"])[:1024],
+        "status_code": entry["status_code"],
+        "execution_time": round(entry["execution_time"], 2),
+        "user_id": entry["user_id"],
+        "client_ip": entry["client_ip"][:50],
+        "headers": render_headers(entry["meta"]),
+        "request_body": render_body(entry["request_body"], entry["request_content_type"]),
+        "response_body": render_body(entry["response_body"], entry["response_content_type"]),
+        "sample_rate": entry["sample_rate"],
+    }
+
+
+class DatabaseWriter:
+    def write(self, records):
+        from freelancing.custom_auth.models import APIRequestLog
+
+        # The writer thread is long-lived: honour CONN_MAX_AGE and drop broken connections
+        close_old_connections()
+        APIRequestLog.objects.bulk_create([APIRequestLog(**record) for record in records])
+
+
+class FileWriter:
+    def __init__(self):
+        path = _setting("API_LOG_FILE", "api_requests.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._handler = RotatingFileHandler(
+            path,
+            maxBytes=_setting("API_LOG_FILE_MAX_BYTES", 50 * 1024 * 1024),
+            backupCount=_setting("API_LOG_FILE_BACKUP_COUNT", 5),
+            encoding="utf-8",
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, records):
+        for record in records:
+            line = json.dumps(
+                dict(record, added_on=record["added_on"].isoformat()), ensure_ascii=False, default=str
+            )
+            self._handler.handle(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
+        self._handler.flush()
+
+
+WRITERS = {"database": DatabaseWriter, "file": FileWriter}
+
+
+class RequestLogQueue:
+    """
+        Bounded queue of request log entries with one writer thread per process.
+
+        enqueue() never blocks: when API_LOG_QUEUE_SIZE entries are waiting
+        the entry is dropped and counted. The thread writes up to
+        API_LOG_BATCH_SIZE records at a time, at least every
+        API_LOG_FLUSH_INTERVAL seconds while entries are waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._writer = None
+        self.dropped = 0
+
+    def _start(self):
+        with self._lock:
+            # Threads do not survive a fork, so a forked worker starts its own
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=_setting("API_LOG_QUEUE_SIZE", 10000))
+            self._writer = WRITERS[_setting("API_LOG_BACKEND", "database")]()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="api-request-log", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, entry):
+        if self._thread is None or self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("API request log queue is full, %s records dropped so far", self.dropped)
+            return False
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < _setting("API_LOG_BATCH_SIZE", 200):
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._writer.write([build_record(entry) for entry in batch])
+        except Exception as exc:
+            logger.warning("Could not write %s API request log records: %s", len(batch), exc)
+
+    def _run(self):
+        interval = _setting("API_LOG_FLUSH_INTERVAL", 2)
+        while True:
+            batch = self._take_batch(interval)
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Write everything queued in this process now; returns the number of records"""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        written = 0
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+
+request_log_queue = RequestLogQueue()
+atexit.register(request_log_queue.flush)
+
+
+def should_sample(rate):
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def read_body(request):
+    """
+    Raw request body, read before the view runs: DRF parses straight from the
+    input stream, after which the body can no longer be read. Uploads are not
+    logged, so multipart bodies are left to stream as usual.
+    """
+    if request.META.get("CONTENT_TYPE", "").startswith("multipart/"):
+        return b""
+    try:
+        return request.body
+    except Exception:
+        # Too large for DATA_UPLOAD_MAX_MEMORY_SIZE; the view reports that
+        return b""
+
+
+def capture(request, response, started, rate, request_body=b""):
+    """Queue the log entry of a finished request; cheap, no formatting happens here"""
+    user = getattr(request, "user", None)
+    response_body = b""
+    if not getattr(response, "streaming", False):
+        response_body = response.content
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    return request_log_queue.enqueue({
+        "added_on": datetime.now(dt_timezone.utc),
+        "method": request.method,
+        "path": request.get_full_path(),
+        "status_code": response.status_code,
+        "execution_time": (time.monotonic() - started) * 1000,
+        "user_id": user.pk if user is not None and user.is_authenticated else None,
+        "client_ip": forwarded.split(",")[0].strip() or request.META.get("REMOTE_ADDR", ""),
+        "meta": {
+            key: value for key, value in request.META.items()
+            if key.startswith("HTTP_") or key in ("CONTENT_TYPE", "CONTENT_LENGTH")
+        },
+        "request_body": request_body,
+        "request_content_type": request.META.get("CONTENT_TYPE", ""),
+        "response_body": response_body,
+        "response_content_type": response.get("Content-Type", ""),
+        "sample_rate": rate,
+    })
@@ -14,6 +14,7 @@ from freelancing.custom_auth.models import (ApplicationUser, CustomPermission,
 from freelancing.utils.validation import UniqueNameMixin
 
 from freelancing.utils.email_send import Util
+from freelancing.utils.images import image_url
 
 from django.template.loader import render_to_string
 # reset password useing email
@@ -107,12 +108,13 @@ class BaseUserSerializer(serializers.ModelSerializer):
 class UserPhotoSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
     width = serializers.ReadOnlyField(source="width_photo", allow_null=True)
     height = serializers.ReadOnlyField(source="height_photo", allow_null=True)
 
     class Meta:
         model = get_user_model()
-        fields = ("id", "image", "width", "height")
+        fields = ("id", "image", "thumbnail", "width", "height")
         ref_name = 'UserPhotoSerializer_ref'
     
     def get_image(self, obj):
@@ -126,6 +128,12 @@ class UserPhotoSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
+    def get_thumbnail(self, obj):
+        try:
+            return image_url(obj.photo, "small", self.context.get('request'))
+        except Exception:
+            return None
+
 
 class PasswordValidationSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
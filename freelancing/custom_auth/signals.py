@@ -1,20 +1,23 @@
 # your_app/signals.py
 
-from django.db.models.signals import post_save
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
-from freelancing.custom_auth.models import Wallet, MerchantProfile
+from freelancing.custom_auth.models import Wallet, MerchantProfile, SiteSetting, CustomBlacklistedToken
+from freelancing.custom_auth.token_revocation import revoked_tokens
+from freelancing.utils.images import schedule_derivatives
 
 User = get_user_model()
 @receiver(post_save, sender=User)
 def create_user_wallet(sender, instance, created, **kwargs):
     if created:
-        # Create wallet with 1000.00 for the new user
-        Wallet.objects.create(
-            user=instance,
-            balance=1000.00
-        )
+        # Create wallet with 1000.00 for the new user, recorded in the ledger
+        wallet = Wallet.objects.create(user=instance)
+        wallet.credit(Decimal("1000.00"), note="Opening balance")
 
 
 @receiver(post_save, sender=MerchantProfile)
@@ -24,4 +27,25 @@ def update_user_merchant_flag(sender, instance, created, **kwargs):
         user.is_merchant = True
         user.merchant_id = instance.id
         user.save(update_fields=["is_merchant", "merchant_id"])
-        # No separate wallet creation - user already has wallet
\ No newline at end of file
+        # No separate wallet creation - user already has wallet
+
+
+@receiver(post_save, sender=SiteSetting)
+@receiver(post_delete, sender=SiteSetting)
+def invalidate_site_setting_cache(sender, instance, **kwargs):
+    # Wait for commit so other workers cannot re-cache the old value
+    key = instance.key
+    transaction.on_commit(lambda: SiteSetting.invalidate_cache(key))
+
+
+@receiver(post_save, sender=CustomBlacklistedToken)
+def add_revoked_token(sender, instance, created, **kwargs):
+    if instance.jti:
+        jti = instance.jti
+        transaction.on_commit(lambda: revoked_tokens.add(jti))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=MerchantProfile)
+def generate_profile_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance)
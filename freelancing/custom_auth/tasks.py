@@ -0,0 +1,33 @@
+from celery import shared_task
+
+from freelancing.custom_auth.activity import activity_tracker
+
+
+@shared_task(ignore_result=True)
+def flush_user_activity():
+    """Write buffered last-seen timestamps to the database"""
+    return activity_tracker.flush()
+
+
+@shared_task(ignore_result=True)
+def snapshot_wallets():
+    """Record the ledger balance of every wallet that moved since its last snapshot"""
+    from freelancing.custom_auth.models import WalletSnapshot
+
+    return WalletSnapshot.take_snapshots()
+
+
+@shared_task(ignore_result=True)
+def drain_email_outbox():
+    """Send due transactional emails from the outbox"""
+    from freelancing.custom_auth.outbox import drain_outbox
+
+    return drain_outbox()
+
+
+@shared_task(ignore_result=True)
+def generate_image_derivatives(label, pk):
+    """Render resized copies of a row's changed image fields"""
+    from freelancing.utils.images import generate_derivatives
+
+    return generate_derivatives(label, pk)
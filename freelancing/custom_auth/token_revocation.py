@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class TokenRevocationList:
+    """
+        Process-local set of revoked access token JTIs.
+
+        The set is warmed from CustomBlacklistedToken on first use and then
+        synced incrementally every TOKEN_REVOCATION_SYNC_INTERVAL seconds, so
+        checking a token normally costs no database query. Revocations are
+        also written to the shared cache, which makes them visible to other
+        workers immediately when the cache is shared (Redis). Each JTI is kept
+        until the access token it belongs to has expired, then dropped on the
+        next sync.
+    """
+
+    CACHE_KEY_PREFIX = "revoked_jti:"
+
+    def __init__(self):
+        # jti -> time after which the revoked token has expired anyway
+        self._jtis = {}
+        self._synced_at = None
+        self._next_sync = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _cache_key(cls, jti):
+        return f"{cls.CACHE_KEY_PREFIX}{jti}"
+
+    @staticmethod
+    def _token_lifetime():
+        return settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]
+
+    def _sync(self):
+        from freelancing.custom_auth.models import CustomBlacklistedToken
+
+        with self._lock:
+            if time.monotonic() < self._next_sync:
+                return
+            now = timezone.now()
+            lifetime = self._token_lifetime()
+            # Tokens blacklisted longer ago than the access token lifetime have
+            # expired on their own and no longer need to be tracked
+            self._jtis = {jti: expires for jti, expires in self._jtis.items() if expires > now}
+            since = now - lifetime
+            if self._synced_at is not None:
+                # Overlap slightly so rows committed during the last sync are not missed
+                since = max(since, self._synced_at - timedelta(seconds=5))
+            for jti, blacklisted_at in CustomBlacklistedToken.objects.filter(
+                blacklisted_at__gte=since, jti__isnull=False
+            ).values_list("jti", "blacklisted_at"):
+                expires = blacklisted_at + lifetime
+                self._jtis[jti] = max(expires, self._jtis.get(jti, expires))
+            self._synced_at = now
+            self._next_sync = time.monotonic() + getattr(
+                settings, "TOKEN_REVOCATION_SYNC_INTERVAL", 60
+            )
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self._sync()
+        if jti in self._jtis:
+            return True
+        if cache.get(self._cache_key(jti)):
+            self._remember(jti)
+            return True
+        return False
+
+    def _remember(self, jti):
+        self._jtis[jti] = timezone.now() + self._token_lifetime()
+
+    def add(self, jti):
+        """Record a revoked JTI locally and in the shared cache"""
+        self._remember(jti)
+        cache.set(
+            self._cache_key(jti), True, int(self._token_lifetime().total_seconds())
+        )
+
+    def reset(self):
+        with self._lock:
+            self._jtis = {}
+            self._synced_at = None
+            self._next_sync = 0
+
+
+revoked_tokens = TokenRevocationList()
@@ -0,0 +1,79 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _namespace_version_key(namespace):
+    return f"view_cache_version:{namespace}"
+
+
+def get_namespace_version(namespace):
+    """
+        Return the current version of a cache namespace.
+        Bumping the version (see invalidate_view_cache) orphans every key built
+        with the old one, so a whole endpoint can be invalidated in O(1).
+    """
+    return cache.get_or_set(_namespace_version_key(namespace), time.time_ns, None)
+
+
+def invalidate_view_cache(*namespaces):
+    """
+        Invalidate every cached response stored under the given namespaces
+    """
+    version = time.time_ns()
+    cache.set_many(
+        {_namespace_version_key(namespace): version for namespace in namespaces}, None
+    )
+
+
+def build_view_cache_key(namespace, request, vary_on_user=False):
+    """
+        Build a cache key that varies on host, API key, query parameters and
+        optionally the authenticated user
+    """
+    parts = [
+        request.get_host(),
+        request.META.get("HTTP_API_KEY", ""),
+        "&".join(
+            f"{key}={value}"
+            for key in sorted(request.query_params)
+            for value in request.query_params.getlist(key)
+        ),
+    ]
+    if vary_on_user:
+        parts.append(str(request.user.pk) if request.user.is_authenticated else "anonymous")
+
+    digest = hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()
+    return f"view_cache:{namespace}:{get_namespace_version(namespace)}:{digest}"
+
+
+def cache_response(namespace, timeout, vary_on_user=False):
+    """
+        Cache-aside decorator for read-only viewset actions.
+        Only successful responses are stored; the cached value is the response
+        data, so the renderer still runs for every request.
+
+        @action(detail=False, methods=["get"])
+        @cache_response("popular_vouchers", timeout=300)
+        def popular_vouchers(self, request): ...
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(self, request, *args, **kwargs):
+            cache_key = build_view_cache_key(namespace, request, vary_on_user=vary_on_user)
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
+            response = view_func(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(cache_key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,3 @@
-from django.conf import settings
-import logging
-from templated_email import send_templated_mail
-from django.core.mail import EmailMessage
 from django.core.exceptions import ValidationError
 
 import os
@@ -24,25 +20,21 @@ class Util:
     @staticmethod
     def send_mail(data):
         """
-        Sends an email using the provided data dictionary.
+        Queues an email using the provided data dictionary.
         Supports plain text and HTML email bodies.
-        Handles exceptions and logs errors if email sending fails.
+        The message is written to the email outbox and sent by a Celery
+        worker once the caller's transaction commits.
         """
+        from freelancing.custom_auth.outbox import queue_mail
+
         try:
-            email = EmailMessage(
+            queue_mail(
+                to=[data["to_email"]],
                 subject=data["subject"],
-                body=data.get("body_text", ""),  # Fallback to plain text body
+                body_text=data.get("body_text", ""),  # Fallback to plain text body
+                body_html=data.get("body_html", ""),
                 from_email=os.environ.get("EMAIL_FROM"),
-                to=[data["to_email"]],
             )
-            
-            # Add HTML content if provided
-            if "body_html" in data:
-                email.content_subtype = "html"
-                email.body = data["body_html"]
-
-            # Send email
-            email.send()
 
         except Exception as e:
             raise ValidationError(str(e))
@@ -0,0 +1,95 @@
+"""
+Proximity search without PostGIS.
+
+Coordinates are stored as an integer geohash: latitude and longitude are each
+quantised to GEOHASH_AXIS_BITS bits and interleaved (longitude first, as in
+standard geohashes). Every geohash cell of any size is then one contiguous
+integer range, so "points in these cells" is a handful of indexed BETWEEN
+range scans on an ordinary B-tree column, on any database.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+GEOHASH_AXIS_BITS = 26
+GEOHASH_BITS = GEOHASH_AXIS_BITS * 2
+
+
+def _quantise(value, low, high, bits):
+    cells = 1 << bits
+    index = int((value - low) / (high - low) * cells)
+    return min(max(index, 0), cells - 1)
+
+
+def _interleave(lng_index, lat_index, bits):
+    code = 0
+    for bit in range(bits - 1, -1, -1):
+        code = (code << 2) | (((lng_index >> bit) & 1) << 1) | ((lat_index >> bit) & 1)
+    return code
+
+
+def encode(latitude, longitude):
+    """Integer geohash of a point, or None when a coordinate is missing"""
+    if latitude is None or longitude is None:
+        return None
+    lat_index = _quantise(float(latitude), -90.0, 90.0, GEOHASH_AXIS_BITS)
+    lng_index = _quantise(float(longitude), -180.0, 180.0, GEOHASH_AXIS_BITS)
+    return _interleave(lng_index, lat_index, GEOHASH_AXIS_BITS)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell_bits(latitude, radius_km):
+    """
+    Finest per-axis precision whose cells are still at least `radius_km`
+    across, so a 3x3 block of cells around the centre covers the circle
+    """
+    lng_km_per_degree = KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6)
+    for bits in range(GEOHASH_AXIS_BITS, 0, -1):
+        height_km = 180.0 / (1 << bits) * KM_PER_DEGREE_LAT
+        width_km = 360.0 / (1 << bits) * lng_km_per_degree
+        if height_km >= radius_km and width_km >= radius_km:
+            return bits
+    return 0
+
+
+def covering_ranges(latitude, longitude, radius_km):
+    """
+    Inclusive (low, high) geohash ranges of the cells that cover the circle
+    of `radius_km` around the point, merged where adjacent
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    bits = _cell_bits(latitude, radius_km)
+    if bits == 0:
+        return [(0, (1 << GEOHASH_BITS) - 1)]
+
+    cells = 1 << bits
+    lat_index = _quantise(latitude, -90.0, 90.0, bits)
+    lng_index = _quantise(longitude, -180.0, 180.0, bits)
+    shift = (GEOHASH_AXIS_BITS - bits) * 2
+
+    prefixes = set()
+    for d_lat in (-1, 0, 1):
+        cell_lat = lat_index + d_lat
+        if not 0 <= cell_lat < cells:
+            continue
+        for d_lng in (-1, 0, 1):
+            # Longitude wraps around the antimeridian
+            prefixes.add(_interleave((lng_index + d_lng) % cells, cell_lat, bits))
+
+    ranges = []
+    for prefix in sorted(prefixes):
+        low, high = prefix << shift, ((prefix + 1) << shift) - 1
+        if ranges and ranges[-1][1] + 1 == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
@@ -0,0 +1,199 @@
+"""
+Resized derivatives of uploaded images.
+
+Every image field listed in DERIVATIVE_FIELDS gets fixed-size derivatives
+(see DERIVATIVE_SIZES) rendered with Pillow by a Celery task after the upload
+commits. Their storage names and dimensions, and the dimensions of the source,
+are recorded on the row in its `image_derivatives` JSON field:
+
+    {"logo": {"source": "merchant/logo/a.png", "width": 1600, "height": 900,
+              "sizes": {"small": {"name": "...webp", "width": 200, "height": 113}, ...}}}
+
+so serving a derivative never reads the storage backend. An entry whose
+`source` no longer matches the field is stale and ignored until the task
+replaces it.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# model label -> image fields with derivatives
+DERIVATIVE_FIELDS = {
+    "custom_auth.applicationuser": ("photo",),
+    "custom_auth.merchantprofile": ("logo", "banner_image"),
+    "voucher.voucher": ("image",),
+    "voucher.advertisement": ("banner_image",),
+}
+
+# size name -> bounding box; derivatives keep the aspect ratio and are never upscaled
+DERIVATIVE_SIZES = {
+    "small": (200, 200),
+    "medium": (640, 640),
+}
+
+FORMAT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def _derivative_format():
+    image_format = getattr(settings, "IMAGE_DERIVATIVE_FORMAT", "WEBP").upper()
+    return image_format if image_format in FORMAT_EXTENSIONS else "WEBP"
+
+
+def derivative_for(file, size):
+    """{"name", "width", "height"} of a current derivative of a field file, or None"""
+    if not file:
+        return None
+    entry = (getattr(file.instance, "image_derivatives", None) or {}).get(file.field.name)
+    if not entry or entry.get("source") != file.name:
+        return None
+    return entry.get("sizes", {}).get(size)
+
+
+def image_url(file, size="small", request=None):
+    """
+    URL of the `size` derivative of a field file, falling back to the
+    original upload until the derivative exists
+    """
+    if not file:
+        return None
+    derivative = derivative_for(file, size)
+    url = file.storage.url(derivative["name"]) if derivative else file.url
+    return request.build_absolute_uri(url) if request else url
+
+
+def stale_fields(instance):
+    """Registered image fields whose recorded derivatives do not match the current file"""
+    derivatives = getattr(instance, "image_derivatives", None) or {}
+    stale = []
+    for field_name in DERIVATIVE_FIELDS.get(instance._meta.label_lower, ()):
+        file = getattr(instance, field_name)
+        entry = derivatives.get(field_name)
+        if file and (not entry or entry.get("source") != file.name):
+            stale.append(field_name)
+        elif not file and entry:
+            stale.append(field_name)
+    return stale
+
+
+def schedule_derivatives(instance):
+    """Queue derivative generation for the instance after commit, if any field changed"""
+    from freelancing.custom_auth.tasks import generate_image_derivatives
+
+    if not stale_fields(instance):
+        return
+    label, pk = instance._meta.label_lower, instance.pk
+    transaction.on_commit(lambda: generate_image_derivatives.delay(label, pk))
+
+
+def render_derivatives(file, image_format=None):
+    """
+    Read the source once and render every size. Returns the entry to record
+    for the field and {size: bytes} of the encoded derivatives.
+    """
+    image_format = image_format or _derivative_format()
+    with file.open("rb"):
+        with Image.open(file) as source:
+            source = ImageOps.exif_transpose(source)
+            entry = {"source": file.name, "width": source.width, "height": source.height, "sizes": {}}
+            if image_format == "JPEG" or source.mode not in ("RGB", "RGBA"):
+                source = source.convert("RGB" if image_format == "JPEG" else "RGBA")
+            rendered = {}
+            for size, box in DERIVATIVE_SIZES.items():
+                derivative = source.copy()
+                derivative.thumbnail(box, Image.LANCZOS)
+                buffer = BytesIO()
+                derivative.save(
+                    buffer, image_format, quality=getattr(settings, "IMAGE_DERIVATIVE_QUALITY", 80)
+                )
+                entry["sizes"][size] = {"width": derivative.width, "height": derivative.height}
+                rendered[size] = buffer.getvalue()
+    return entry, rendered
+
+
+def _store(file, entry, rendered, image_format):
+    directory, filename = posixpath.split(file.name)
+    stem = posixpath.splitext(filename)[0]
+    extension = FORMAT_EXTENSIONS[image_format]
+    for size, content in rendered.items():
+        name = posixpath.join(directory, "derivatives", f"{stem}_{size}.{extension}")
+        entry["sizes"][size]["name"] = file.storage.save(name, ContentFile(content))
+    return entry
+
+
+def _delete_files(storage, entry):
+    for derivative in (entry or {}).get("sizes", {}).values():
+        if derivative.get("name"):
+            try:
+                storage.delete(derivative["name"])
+            except Exception as exc:
+                logger.warning("Could not delete image derivative %s: %s", derivative["name"], exc)
+
+
+def generate_derivatives(label, pk):
+    """
+    Render and store derivatives for the stale image fields of one row.
+
+    Rendering happens outside any transaction; the results are merged under
+    a row lock, and only for fields that still hold the file that was
+    rendered, so a newer upload is never overwritten by an older one.
+    Returns the names of the fields that were updated.
+    """
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return []
+
+    image_format = _derivative_format()
+    results = {}
+    for field_name in stale_fields(instance):
+        file = getattr(instance, field_name)
+        if not file:
+            results[field_name] = None
+            continue
+        try:
+            entry, rendered = render_derivatives(file, image_format)
+        except Exception as exc:
+            logger.warning("Could not render derivatives of %s %s.%s: %s", label, pk, field_name, exc)
+            continue
+        results[field_name] = _store(file, entry, rendered, image_format)
+
+    updated, replaced, discarded = [], [], []
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).first()
+        if current is None:
+            discarded = [entry for entry in results.values() if entry]
+        else:
+            derivatives = dict(current.image_derivatives or {})
+            changes = {}
+            for field_name, entry in results.items():
+                current_name = getattr(current, field_name).name or None
+                if (entry["source"] if entry else None) != current_name:
+                    if entry:
+                        discarded.append(entry)
+                    continue
+                replaced.append(derivatives.get(field_name))
+                if entry:
+                    derivatives[field_name] = entry
+                else:
+                    derivatives.pop(field_name, None)
+                updated.append(field_name)
+                # Record source dimensions so ImageField never reads them from storage
+                field = current._meta.get_field(field_name)
+                if entry and field.width_field and field.height_field:
+                    changes[field.width_field] = entry["width"]
+                    changes[field.height_field] = entry["height"]
+            if updated:
+                model.objects.filter(pk=pk).update(image_derivatives=derivatives, **changes)
+
+    storage = getattr(instance, DERIVATIVE_FIELDS[label][0]).storage
+    for entry in replaced + discarded:
+        _delete_files(storage, entry)
+    return updated
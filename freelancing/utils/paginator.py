@@ -1,12 +1,191 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(pagination.PageNumberPagination):
+    """
+        Page-number pagination. Requests that send `?cursor=` or
+        `?pagination=cursor` are handed to KeysetPagination instead, so any
+        list whose model has the cursor ordering fields can be paged by cursor
+        without changing the view; other lists stay page-numbered.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.is_requested(request) and KeysetPagination.supports(queryset, view):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
         return Response({
             'page': self.page.number,
             'page_size': len(self.page.object_list),
             'total_count': self.page.paginator.count,
             'results': data
         })
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+        Keyset (seek) pagination over `(create_time, id)` or any other unique
+        ordering set as `cursor_ordering` on the view, e.g.
+        cursor_ordering = ("-purchased_at", "-id").
+
+        Pages are fetched with WHERE (create_time, id) < (last seen) instead of
+        OFFSET, and COUNT(*) only runs when the client sends `?count=true`.
+        Responses keep the `page`/`page_size`/`results` envelope; `page` is the
+        current cursor and `next`/`previous` link to the neighbouring pages.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-create_time', '-id')
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get('pagination') == 'cursor'
+
+    @classmethod
+    def supports(cls, queryset, view=None):
+        """Whether the queryset's model has every field of the view's cursor ordering"""
+        model = getattr(queryset, 'model', None)
+        if model is None:
+            return False
+        for field in getattr(view, 'cursor_ordering', cls.ordering):
+            try:
+                model._meta.get_field(field.lstrip('-'))
+            except FieldDoesNotExist:
+                return False
+        return True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'cursor_ordering', self.ordering))
+        self.cursor = request.query_params.get(self.cursor_query_param) or None
+        self.total_count = queryset.count() if self._wants_count(request) else None
+
+        values, reverse = self.decode_cursor(self.cursor)
+        if values is not None:
+            values = self._cursor_values(queryset.model, values)
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        response = {
+            'page': self.cursor,
+            'page_size': len(self.page),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total_count is not None:
+            response['total_count'] = self.total_count
+        return Response(response)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, 0))
+        except ValueError:
+            size = 0
+        if size > 0:
+            return min(size, self.max_page_size)
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self._position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Invalid cursor')
+
+    def _cursor_values(self, model, values):
+        """Cursor values converted by their ordering fields, so forged ones are rejected before the query"""
+        try:
+            converted = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if any(value is None for value in converted):
+            raise NotFound('Invalid cursor')
+        return converted
+
+    def _wants_count(self, request):
+        return request.query_params.get('count', '').lower() in ('1', 'true', 'yes')
+
+    def _position(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _link(self, values, reverse):
+        # Only the first page pays for COUNT(*); follow-up links drop `count`
+        url = remove_query_param(remove_query_param(self.base_url, 'pagination'), 'count')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _seek(ordering, values):
+        """WHERE clause for rows after `values` in `ordering`: (a, b) > (x, y) expanded"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = f'{name}__lt' if field.startswith('-') else f'{name}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
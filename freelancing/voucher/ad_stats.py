@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+IMPRESSION = "i"
+CLICK = "c"
+
+
+def _hour(timestamp=None):
+    """Unix time of the start of the current (or given) hour"""
+    timestamp = time.time() if timestamp is None else timestamp
+    return int(timestamp // 3600 * 3600)
+
+
+class AdvertisementStatsBuffer:
+    """
+        Counts advertisement impressions and clicks without a write per event.
+
+        Counts are kept per (advertisement, hour) in a Redis hash when the
+        default cache is Redis, otherwise in this process, and added to
+        AdvertisementHourlyStats by flush() (see the flush_advertisement_stats
+        Celery task). Without Redis the buffer is also flushed inline once per
+        AD_STATS_FLUSH_INTERVAL, since a worker process cannot see it.
+    """
+
+    PENDING_KEY = "advertisement_stats:pending"
+
+    def __init__(self):
+        self._pending = defaultdict(int)
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _redis_client():
+        if isinstance(cache, RedisCache):
+            return cache._cache.get_client(write=True)
+        return None
+
+    def _add(self, counts):
+        """Add {(advertisement_id, hour, kind): count} to the buffer"""
+        client = self._redis_client()
+        if client is not None:
+            pipe = client.pipeline(transaction=False)
+            key = cache.make_key(self.PENDING_KEY)
+            for (advertisement_id, hour, kind), count in counts.items():
+                pipe.hincrby(key, f"{advertisement_id}:{hour}:{kind}", count)
+            pipe.execute()
+            return
+
+        with self._lock:
+            for field, count in counts.items():
+                self._pending[field] += count
+        if time.monotonic() - self._last_flush >= getattr(settings, "AD_STATS_FLUSH_INTERVAL", 60):
+            try:
+                self.flush()
+            except Exception:
+                # Already logged and put back for the next flush
+                pass
+
+    def _record(self, counts):
+        # Counting is best effort; serving the advertisement matters more
+        try:
+            self._add(counts)
+        except Exception as exc:
+            logger.warning("Could not record advertisement stats: %s", exc)
+
+    def record_impressions(self, advertisement_ids):
+        hour = _hour()
+        counts = defaultdict(int)
+        for advertisement_id in advertisement_ids:
+            counts[(advertisement_id, hour, IMPRESSION)] += 1
+        if counts:
+            self._record(counts)
+
+    def record_click(self, advertisement_id):
+        self._record({(advertisement_id, _hour(), CLICK): 1})
+
+    def drain(self):
+        """
+            Atomically take every buffered {(advertisement_id, hour, kind): count}
+        """
+        client = self._redis_client()
+        if client is not None:
+            key = cache.make_key(self.PENDING_KEY)
+            pipe = client.pipeline()
+            pipe.hgetall(key)
+            pipe.delete(key)
+            entries, _ = pipe.execute()
+            pending = {}
+            for field, count in entries.items():
+                advertisement_id, hour, kind = (field.decode() if isinstance(field, bytes) else field).split(":")
+                pending[(int(advertisement_id), int(hour), kind)] = int(count)
+            return pending
+
+        with self._lock:
+            pending, self._pending = dict(self._pending), defaultdict(int)
+            self._last_flush = time.monotonic()
+        return pending
+
+    def flush(self, batch_size=500):
+        """
+            Add buffered counts to the hourly rollups, returns the number of rows upserted.
+            Counts that could not be written are put back for the next flush.
+        """
+        from freelancing.voucher.models import Advertisement
+
+        pending = self.drain()
+        if not pending:
+            return 0
+
+        rows = defaultdict(lambda: [0, 0])
+        for (advertisement_id, hour, kind), count in pending.items():
+            rows[(advertisement_id, hour)][0 if kind == IMPRESSION else 1] += count
+        # Clicks are recorded by id without a lookup, and ads can be deleted in between
+        existing_ids = set(
+            Advertisement.objects.filter(pk__in={key[0] for key in rows}).values_list("pk", flat=True)
+        )
+        rows = [
+            (advertisement_id, hour, impressions, clicks)
+            for (advertisement_id, hour), (impressions, clicks) in rows.items()
+            if advertisement_id in existing_ids
+        ]
+
+        try:
+            with transaction.atomic():
+                for start in range(0, len(rows), batch_size):
+                    self._upsert(rows[start:start + batch_size])
+        except Exception:
+            logger.exception("Could not flush advertisement stats, keeping %s counters", len(pending))
+            self._add(pending)
+            raise
+        return len(rows)
+
+    @staticmethod
+    def _upsert(rows):
+        """
+            One INSERT ... ON CONFLICT DO UPDATE adding the counts of every row
+            to its (advertisement, hour) rollup
+        """
+        from freelancing.voucher.models import AdvertisementHourlyStats
+
+        quote = connection.ops.quote_name
+        table = quote(AdvertisementHourlyStats._meta.db_table)
+        advertisement, hour_column, impressions, clicks = (
+            quote(name) for name in ("advertisement_id", "hour", "impressions", "clicks")
+        )
+        params = []
+        for advertisement_id, hour, impression_count, click_count in rows:
+            hour = connection.ops.adapt_datetimefield_value(
+                datetime.fromtimestamp(hour, tz=dt_timezone.utc)
+            )
+            params.extend([advertisement_id, hour, impression_count, click_count])
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({advertisement}, {hour_column}, {impressions}, {clicks}) VALUES {values} "
+                f"ON CONFLICT ({advertisement}, {hour_column}) DO UPDATE SET "
+                f"{impressions} = {table}.{impressions} + EXCLUDED.{impressions}, "
+                f"{clicks} = {table}.{clicks} + EXCLUDED.{clicks}",
+                params,
+            )
+
+
+ad_stats = AdvertisementStatsBuffer()
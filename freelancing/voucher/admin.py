@@ -2,7 +2,38 @@ from django.contrib import admin
 
 # Register your models here.
 
-from freelancing.voucher.models import Voucher, VoucherType 
+from freelancing.voucher.models import (
+    Voucher, VoucherType, UserVoucherStats, GiftCardShare, GiftCardDelivery, Advertisement,
+    AdvertisementHourlyStats
+)
 
 admin.site.register(Voucher)
-admin.site.register(VoucherType)
\ No newline at end of file
+admin.site.register(VoucherType)
+admin.site.register(UserVoucherStats)
+
+
+@admin.register(Advertisement)
+class AdvertisementAdmin(admin.ModelAdmin):
+    list_display = ('voucher', 'city', 'state', 'start_date', 'end_date', 'weight', 'is_active')
+    list_filter = ('is_active', 'state')
+    list_editable = ('weight',)
+
+
+@admin.register(AdvertisementHourlyStats)
+class AdvertisementHourlyStatsAdmin(admin.ModelAdmin):
+    list_display = ('advertisement', 'hour', 'impressions', 'clicks')
+    date_hierarchy = 'hour'
+    readonly_fields = ('advertisement', 'hour', 'impressions', 'clicks')
+
+
+class GiftCardDeliveryInline(admin.TabularInline):
+    model = GiftCardDelivery
+    extra = 0
+    readonly_fields = ('phone_number', 'status', 'attempts', 'error', 'sent_at')
+
+
+@admin.register(GiftCardShare)
+class GiftCardShareAdmin(admin.ModelAdmin):
+    list_display = ('share_id', 'voucher', 'user', 'status', 'total_count', 'sent_count', 'failed_count', 'create_time')
+    list_filter = ('status',)
+    inlines = [GiftCardDeliveryInline]
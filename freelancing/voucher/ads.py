@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from freelancing.utils.cache import get_namespace_version
+
+INDEX_NAMESPACE = "advertisement_index"
+
+
+def normalise_location(value):
+    return " ".join((value or "").split()).casefold()
+
+
+class AliasSampler:
+    """
+    Walker/Vose alias table: after O(n) setup, each weighted draw costs one
+    random index and one coin flip, whatever the number of items
+    """
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.weights = [float(weight) for weight in weights]
+        count = len(self.items)
+        total = sum(self.weights)
+        self._probability = [1.0] * count
+        self._alias = list(range(count))
+        if not count or total <= 0:
+            return
+
+        scaled = [weight * count / total for weight in self.weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Leftovers are 1.0 up to rounding error
+        for index in small + large:
+            self._probability[index] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random):
+        column = rng.randrange(len(self.items))
+        return column if rng.random() < self._probability[column] else self._alias[column]
+
+    def sample(self, count, rng=random):
+        """
+        Up to `count` distinct items with a positive weight, each pick weighted
+        by its weight. Small samples reject repeated alias draws; when most of
+        the items are wanted, or skewed weights keep repeating the same picks,
+        the rest comes from a weighted shuffle (key = u ** (1 / weight)).
+        """
+        size = len(self.items)
+        if count <= 0 or not size:
+            return []
+
+        chosen = []
+        seen = set()
+        if count * 2 < size:
+            attempts = count * 4
+            while len(chosen) < count and attempts:
+                attempts -= 1
+                index = self.draw(rng)
+                if index not in seen and self.weights[index] > 0:
+                    seen.add(index)
+                    chosen.append(index)
+        if len(chosen) < count:
+            keys = sorted(
+                (
+                    (rng.random() ** (1.0 / weight), index)
+                    for index, weight in enumerate(self.weights)
+                    if weight > 0 and index not in seen
+                ),
+                reverse=True,
+            )
+            chosen.extend(index for _, index in keys[:count - len(chosen)])
+        return [self.items[index] for index in chosen]
+
+
+class AdvertisementIndex:
+    """
+    Process-local index of the advertisements running today, keyed by
+    normalised (state, city), with their serialized payloads.
+
+    Serving an ad is a dictionary lookup plus alias-method draws; nothing is
+    read from the database. The index is rebuilt when the local date changes,
+    every AD_INDEX_REBUILD_INTERVAL seconds, and when an advertisement,
+    voucher or merchant change bumps the "advertisement_index" cache
+    namespace, which each process checks at most every
+    AD_INDEX_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._all = None
+        self._by_location = {}
+        self._live_ids = frozenset()
+        self._built_for = None
+        self._version = None
+        self._next_check = 0
+        self._next_rebuild = 0
+
+    def rebuild(self):
+        from freelancing.voucher.models import Advertisement
+        from freelancing.voucher.serializers import AdvertisementSerializer
+
+        version = get_namespace_version(INDEX_NAMESPACE)
+        today = timezone.localdate()
+        ads = (
+            Advertisement.objects.filter(
+                start_date__lte=today, end_date__gte=today, is_active=True, weight__gt=0
+            )
+            .select_related('voucher__merchant')
+            .order_by('-create_time')
+        )
+        payloads, weights, locations = [], [], {}
+        for ad, payload in zip(ads, AdvertisementSerializer(ads, many=True).data):
+            payloads.append(payload)
+            weights.append(ad.weight)
+            key = (normalise_location(ad.state), normalise_location(ad.city))
+            locations.setdefault(key, ([], []))
+            locations[key][0].append(payload)
+            locations[key][1].append(ad.weight)
+
+        with self._lock:
+            self._all = AliasSampler(payloads, weights)
+            self._by_location = {
+                key: AliasSampler(items, item_weights) for key, (items, item_weights) in locations.items()
+            }
+            self._live_ids = frozenset(payload["id"] for payload in payloads)
+            self._built_for = today
+            self._version = version
+            now = time.monotonic()
+            self._next_check = now + getattr(settings, "AD_INDEX_CHECK_INTERVAL", 5)
+            self._next_rebuild = now + getattr(settings, "AD_INDEX_REBUILD_INTERVAL", 300)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._all is None or now >= self._next_rebuild or timezone.localdate() != self._built_for:
+            self.rebuild()
+        elif now >= self._next_check:
+            if get_namespace_version(INDEX_NAMESPACE) != self._version:
+                self.rebuild()
+            else:
+                self._next_check = now + getattr(settings, "AD_INDEX_CHECK_INTERVAL", 5)
+
+    def serve(self, limit, state=None, city=None):
+        """Up to `limit` distinct live ads, optionally for one location, in weighted random order"""
+        self._ensure_fresh()
+        if state is None and city is None:
+            sampler = self._all
+        else:
+            sampler = self._by_location.get((normalise_location(state), normalise_location(city)))
+        return sampler.sample(limit) if sampler else []
+
+    def is_live(self, advertisement_id):
+        """Whether the advertisement is currently being served"""
+        self._ensure_fresh()
+        return advertisement_id in self._live_ids
+
+    def reset(self):
+        with self._lock:
+            self._all = None
+            self._by_location = {}
+            self._live_ids = frozenset()
+            self._built_for = None
+
+
+advertisement_index = AdvertisementIndex()
@@ -2,25 +2,40 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from freelancing.utils.permissions import IsAPIKEYAuthenticated
+from freelancing.utils.cache import cache_response
+from django.conf import settings
 from django.db import transaction
 import json
 import requests
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from freelancing.custom_auth.auth_backends.authentication import CachedJWTAuthentication
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import IntegrityError, DatabaseError
+from django.db.models import Exists, OuterRef, F, Sum
+from django.db.models.functions import TruncDate
+from datetime import timedelta
 from decimal import Decimal, InvalidOperation
 
-from freelancing.voucher.models import Voucher, WhatsAppContact, Advertisement, UserVoucherRedemption, VoucherType
+from freelancing.voucher.counters import increment_redemption_count, get_redemption_count, reserve_stock
+from freelancing.voucher.models import (
+    Voucher, WhatsAppContact, Advertisement, UserVoucherRedemption, VoucherType, UserVoucherStats,
+    GiftCardShare, AdvertisementHourlyStats
+)
 from freelancing.voucher.serializers import (
     VoucherCreateSerializer, WhatsAppContactSerializer, GiftCardShareSerializer, 
     AdvertisementSerializer, VoucherListSerializer, VoucherPurchaseSerializer,
     UserVoucherSerializer, VoucherRedeemSerializer, VoucherTypeSerializer,
-    VoucherCancelSerializer, VoucherRefundSerializer, PurchaseHistorySerializer
+    VoucherCancelSerializer, VoucherRefundSerializer, PurchaseHistorySerializer,
+    GiftCardShareStatusSerializer
 )
-from freelancing.custom_auth.models import Wallet, SiteSetting
-from rest_framework.filters import SearchFilter
+from freelancing.custom_auth.models import Wallet, SiteSetting, MerchantProfile
+from freelancing.voucher.search import VoucherSearchFilter
+from freelancing.voucher.autocomplete import autocomplete_index
+from freelancing.voucher.ads import advertisement_index
+from freelancing.voucher.ad_stats import ad_stats
+from freelancing.voucher import trending, whatsapp
+from freelancing.voucher.sharing import create_share
 
 class VoucherViewSet(viewsets.ModelViewSet):
     queryset = Voucher.objects.all()
@@ -29,15 +44,15 @@ class VoucherViewSet(viewsets.ModelViewSet):
         permissions.IsAuthenticated,
         IsAPIKEYAuthenticated,
     ]
-    authentication_classes = [JWTAuthentication]
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    authentication_classes = [CachedJWTAuthentication]
+    filter_backends = (DjangoFilterBackend, VoucherSearchFilter)
     search_fields = ["title", "message", "merchant__business_name"]
     ordering = ["-create_time"]
     filterset_fields = ["voucher_type", "is_gift_card", "category"]
 
     def get_queryset(self):
         # Only show merchant's own vouchers
-        return Voucher.objects.filter(merchant__user=self.request.user)
+        return Voucher.objects.filter(merchant__user=self.request.user).defer('search_vector')
 
     def perform_create(self, serializer):
         serializer.save()
@@ -48,24 +63,21 @@ class VoucherViewSet(viewsets.ModelViewSet):
         """Redeem a voucher - increases redemption count"""
         try:
             voucher = self.get_object()
-           
-            with transaction.atomic():
-                # Check if voucher has a limit and if it's been reached
-                if voucher.count and voucher.redemption_count >= voucher.count:
-                    return Response(
-                        {"error": "Voucher redemption limit reached"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-               
-                # Increment redemption count
-                voucher.redemption_count += 1
-                voucher.save(update_fields=['redemption_count'])
-               
-                return Response({
-                    "message": "Voucher redeemed successfully",
-                    "redemption_count": voucher.redemption_count,
-                    "remaining": voucher.count - voucher.redemption_count if voucher.count else None
-                })
+
+            # Conditional UPDATE: enforces the limit without a read-modify-write race
+            if not increment_redemption_count(voucher):
+                return Response(
+                    {"error": "Voucher redemption limit reached"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            voucher.refresh_from_db(fields=['redemption_count'])
+            redemption_count = get_redemption_count(voucher)
+            return Response({
+                "message": "Voucher redeemed successfully",
+                "redemption_count": redemption_count,
+                "remaining": voucher.count - redemption_count if voucher.count else None
+            })
                
         except Voucher.DoesNotExist:
             return Response(
@@ -102,34 +114,26 @@ class VoucherViewSet(viewsets.ModelViewSet):
                 user=request.user,
                 phone_number__in=phone_numbers,
                 is_on_whatsapp=True
-            )
+            ).values_list('phone_number', flat=True)
+            recipients = list(dict.fromkeys(user_contacts))
            
-            if not user_contacts.exists():
+            if not recipients:
                 return Response(
                     {"error": "No valid WhatsApp contacts found"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
            
-            # Send gift card via WhatsApp API
-            success_count = 0
-            failed_numbers = []
-           
-            for contact in user_contacts:
-                try:
-                    # WhatsApp API call (you'll need to implement this based on your WhatsApp provider)
-                    success = self.send_whatsapp_gift_card(contact.phone_number, voucher)
-                    if success:
-                        success_count += 1
-                    else:
-                        failed_numbers.append(contact.phone_number)
-                except Exception as e:
-                    failed_numbers.append(contact.phone_number)
+            # Delivery runs in a Celery job; the client polls the share for progress
+            share = create_share(request.user, voucher, recipients)
+            skipped_numbers = [str(number) for number in phone_numbers if str(number) not in recipients]
            
             return Response({
-                "message": f"Gift card shared successfully to {success_count} contacts",
-                "success_count": success_count,
-                "failed_numbers": failed_numbers
-            })
+                "message": f"Gift card queued for {len(recipients)} contacts",
+                "share_id": share.share_id,
+                "status": share.status,
+                "total_count": share.total_count,
+                "skipped_numbers": skipped_numbers
+            }, status=status.HTTP_202_ACCEPTED)
            
         except Exception as e:
             return Response(
@@ -137,40 +141,36 @@ class VoucherViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def send_whatsapp_gift_card(self, phone_number, voucher):
-        """Send gift card via WhatsApp API"""
-        try:
-            # Implement your WhatsApp API integration here
-            # This is a placeholder implementation
-            return True
-        except Exception:
-            return False
-
-    def get_voucher_value(self, voucher):
-        """Get voucher value based on type"""
-        if voucher.voucher_type.name == 'percentage':
-            return f"{voucher.percentage_value}% off"
-        elif voucher.voucher_type.name == 'flat':
-            return f"₹{voucher.flat_amount} off"
-        elif voucher.voucher_type.name == 'product':
-            return f"Free {voucher.product_name}"
-        return "Special offer"
+    @action(detail=False, methods=["get"], url_path=r"shares/(?P<share_id>[0-9a-f-]{32,36})")
+    def share_status(self, request, share_id=None):
+        """Delivery progress of a gift card share"""
+        share = GiftCardShare.objects.filter(
+            share_id=share_id, user=request.user
+        ).prefetch_related('deliveries').first()
+        if share is None:
+            return Response(
+                {"error": "Share not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(GiftCardShareStatusSerializer(share).data)
 
     @action(detail=False, methods=["get"], url_path="popular", permission_classes=[permissions.AllowAny,
                                                                 IsAPIKEYAuthenticated])
+    @cache_response("popular_vouchers", timeout=300)
     def popular_vouchers(self, request):
         try:
-            # Fixed: Use redemption_count instead of count for filtering
-            top_vouchers = Voucher.objects.filter(
-                redemption_count__gt=0,
+            # Ranked by time-decayed purchase/redemption activity, topped up by all-time redemptions
+            vouchers = Voucher.objects.select_related('merchant', 'voucher_type').defer('search_vector').filter(
                 is_gift_card=False  # Exclude gift cards from public listing
-            ).order_by("-redemption_count")[:10]
+            )
+            top_vouchers, scores = trending.ranked_vouchers(vouchers, limit=10)
            
             data = [{
                 "id": v.id,
                 "title": v.title,
                 "merchant": v.merchant.business_name,
                 "redemption_count": v.redemption_count,
+                "trending_score": round(scores.get(v.pk, 0.0), 4),
                 "voucher_type": v.voucher_type.name
             } for v in top_vouchers]
            
@@ -186,15 +186,36 @@ class PublicVoucherViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Voucher.objects.filter(is_active=True, is_gift_card=False)
     serializer_class = VoucherListSerializer
     permission_classes = [permissions.IsAuthenticated, IsAPIKEYAuthenticated]
-    authentication_classes = [JWTAuthentication]
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    authentication_classes = [CachedJWTAuthentication]
+    filter_backends = (DjangoFilterBackend, VoucherSearchFilter)
     search_fields = ["title", "message", "merchant__business_name"]
     filterset_fields = ["voucher_type", "category", "merchant"]
     ordering = ["-create_time"]
 
+    NEARBY_DEFAULT_RADIUS_KM = 10
+    NEARBY_MAX_RADIUS_KM = 100
+    NEARBY_MAX_MERCHANTS = 500
+
     def get_queryset(self):
         """Filter vouchers based on availability and user preferences"""
-        queryset = super().get_queryset()
+        queryset = (
+            super().get_queryset()
+            .select_related('merchant', 'voucher_type', 'category')
+            .defer('search_vector')
+        )
+
+        # Resolve "already purchased" in the same query instead of once per row
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_purchased=Exists(
+                    UserVoucherRedemption.objects.filter(
+                        user=user,
+                        voucher=OuterRef('pk'),
+                        is_active=True
+                    )
+                )
+            )
         
         # Filter by category if provided
         category_id = self.request.query_params.get('category')
@@ -222,7 +243,14 @@ class PublicVoucherViewSet(viewsets.ReadOnlyModelViewSet):
         
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context.update(VoucherListSerializer.get_listing_context(self.request))
+        return context
+
     @action(detail=False, methods=["get"], url_path="categories")
+    @cache_response("voucher_categories", timeout=3600)
     def voucher_categories(self, request):
         """Get all voucher categories"""
         categories = VoucherType.objects.filter(is_active=True)
@@ -231,26 +259,76 @@ class PublicVoucherViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="featured")
     def featured_vouchers(self, request):
-        """Get featured vouchers (most popular)"""
-        featured = self.get_queryset().filter(
-            redemption_count__gt=0
-        ).order_by('-redemption_count')[:10]
+        """Get featured vouchers (trending now, optionally within `category`)"""
+        response = self._featured_listing(request)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        # Purchase flags change with every purchase and wallet move, so they are never cached
+        return Response(VoucherListSerializer.apply_purchase_flags(response.data, request))
+
+    @cache_response("featured_vouchers", timeout=120)
+    def _featured_listing(self, request):
+        featured, _ = trending.ranked_vouchers(
+            self.get_queryset(), limit=10, category_id=request.query_params.get('category')
+        )
         serializer = self.get_serializer(featured, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], url_path="autocomplete")
+    def autocomplete(self, request):
+        """
+        Typo-tolerant suggestions of merchant names and voucher titles for `q`,
+        served from the in-process autocomplete index
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 25)
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete_index.search(request.query_params.get('q', ''), limit=limit))
+
     @action(detail=False, methods=["get"], url_path="nearby")
     def nearby_vouchers(self, request):
-        """Get vouchers from nearby merchants"""
-        # This would require location-based filtering
-        # For now, return recent vouchers
-        nearby = self.get_queryset().order_by('-create_time')[:20]
-        serializer = self.get_serializer(nearby, many=True)
-        return Response(serializer.data)
+        """
+        Get vouchers from merchants within `radius_km` (default 10) of `lat`/`lng`,
+        nearest first. Without coordinates, returns the most recent vouchers.
+        """
+        lat = request.query_params.get('lat')
+        lng = request.query_params.get('lng')
+        if lat is None and lng is None:
+            nearby = self.get_queryset().order_by('-create_time')[:20]
+            serializer = self.get_serializer(nearby, many=True)
+            return Response(serializer.data)
+
+        try:
+            lat, lng = float(lat), float(lng)
+            radius_km = float(request.query_params.get('radius_km', self.NEARBY_DEFAULT_RADIUS_KM))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "lat, lng and radius_km must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({"error": "Invalid coordinates"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius_km <= self.NEARBY_MAX_RADIUS_KM:
+            return Response(
+                {"error": f"radius_km must be between 0 and {self.NEARBY_MAX_RADIUS_KM}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        distances = dict(MerchantProfile.nearby(lat, lng, radius_km)[:self.NEARBY_MAX_MERCHANTS])
+        vouchers = list(self.get_queryset().filter(merchant_id__in=distances))
+        vouchers.sort(key=lambda v: (distances[v.merchant_id], -v.create_time.timestamp()))
+        vouchers = vouchers[:20]
+
+        data = self.get_serializer(vouchers, many=True).data
+        for item, voucher in zip(data, vouchers):
+            item['distance_km'] = round(distances[voucher.merchant_id], 2)
+        return Response(data)
 
 class VoucherPurchaseViewSet(viewsets.ViewSet):
     """Handle voucher purchases with optimized transaction management"""
     permission_classes = [permissions.IsAuthenticated, IsAPIKEYAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
     @action(detail=False, methods=["post"], url_path="purchase", permission_classes=[permissions.AllowAny,
                                                                 IsAPIKEYAuthenticated])
@@ -266,88 +344,59 @@ class VoucherPurchaseViewSet(viewsets.ViewSet):
         serializer = VoucherPurchaseSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
-        voucher_id = serializer.validated_data['voucher_id']
+        voucher = serializer.validated_data['voucher']
         user = request.user
+
+        # 1. Resolve cost before the transaction (cached setting, no row locks held)
+        try:
+            cost = Decimal(str(SiteSetting.get_value("voucher_cost", "10")))
+        except (InvalidOperation, ValueError, TypeError):
+            # If there's any issue with the setting, use default value
+            cost = Decimal("10")
+        if cost <= 0:
+            return Response(
+                {"error": "Invalid voucher cost"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
-            # Use atomic transaction for all database operations
+            # Short transaction: conditional debit, stock reservation, purchase insert, history insert
             with transaction.atomic():
-                # 1. Get voucher with select_for_update to prevent race conditions
-                try:
-                    voucher = Voucher.objects.select_for_update().get(
-                        id=voucher_id, 
-                        is_active=True
-                    )
-                except Voucher.DoesNotExist:
-                    raise ValidationError("Voucher not found or inactive")
-                
-                # 2. Check if user already purchased this voucher
-                if UserVoucherRedemption.objects.filter(
-                    user=user, 
-                    voucher=voucher
-                ).exists():
-                    raise ValidationError("You have already purchased this voucher")
-                
-                # 3. Check voucher availability
-                if voucher.count and voucher.redemption_count >= voucher.count:
-                    raise ValidationError("Voucher is out of stock")
+                # 2. Debit with UPDATE ... WHERE balance >= cost (locks the wallet row only until commit)
+                wallet = Wallet.debit_for_user(
+                    user, cost, note=f"Voucher Purchase: {voucher.title}", ref_id=str(voucher.id)
+                )
 
-                # 4. Get user wallet with select_for_update
-                try:
-                    wallet = Wallet.objects.select_for_update().get(user=user)
-                except Wallet.DoesNotExist:
-                    raise ValidationError("User wallet not found")
-                
-                # 5. Calculate cost with proper decimal handling
-                try:
-                    # Get voucher cost from settings, with better error handling
-                    voucher_cost_setting = SiteSetting.get_value("voucher_cost", "10")
-                    cost = Decimal(str(voucher_cost_setting))
-                    if cost <= 0:
-                        raise ValidationError("Invalid voucher cost")
-                except (InvalidOperation, ValueError, TypeError):
-                    # If there's any issue with the setting, use default value
-                    cost = Decimal("10")
-                    if cost <= 0:
-                        raise ValidationError("Invalid voucher cost")
-                
-                # 6. Validate sufficient balance
-                if wallet.balance < cost:
-                    raise ValidationError(
-                        f"Insufficient balance. Required: ₹{cost}, Available: ₹{wallet.balance}"
-                    ) 
-                
-                # 7. Generate unique transaction ID
+                # 3. Reserve stock with UPDATE ... WHERE sold_count < count; sold out rolls the debit back
+                if not reserve_stock(voucher):
+                    raise ValidationError("Voucher is out of stock")
                 transaction_id = f"WT-{wallet.id}-{timezone.now().strftime('%Y%m%d%H%M%S')}"
 
-                # 8. Deduct from wallet with error handling
+                # 4. Create redemption record; the (user, voucher) unique constraint
+                # rejects duplicate purchases and rolls the debit back
                 try:
-                    wallet.deduct(cost, note=f"Voucher Purchase: {voucher.title}", ref_id=str(voucher.id))
-                except ValidationError as e:
-                    raise ValidationError(f"Wallet deduction failed: {str(e)}")
-                # 9. Create redemption record
-                try:
-                    redemption = UserVoucherRedemption.objects.create(
-                        user=user,
-                        voucher=voucher,
-                        purchase_cost=cost,
-                        is_active=True,
-                        wallet_transaction_id=transaction_id
-                    )
+                    with transaction.atomic():
+                        redemption = UserVoucherRedemption.objects.create(
+                            user=user,
+                            voucher=voucher,
+                            purchase_cost=cost,
+                            is_active=True,
+                            wallet_transaction_id=transaction_id
+                        )
                 except IntegrityError:
-                    raise ValidationError("Failed to create purchase record")
+                    raise ValidationError("You have already purchased this voucher")
 
-                return Response({
-                    "message": "Voucher purchased successfully",
-                    "voucher_id": voucher.id,
-                    "voucher_title": voucher.title,
-                    "purchase_cost": float(cost),
-                    "remaining_balance": float(wallet.balance),
-                    "redemption_id": redemption.id,
-                    "purchase_reference": redemption.purchase_reference,
-                    "expiry_date": redemption.expiry_date,
-                    "transaction_id": transaction_id
-                }, status=status.HTTP_201_CREATED)
+            return Response({
+                "message": "Voucher purchased successfully",
+                "voucher_id": voucher.id,
+                "voucher_title": voucher.title,
+                "purchase_cost": float(cost),
+                "remaining_balance": float(wallet.balance),
+                "redemption_id": redemption.id,
+                "purchase_reference": redemption.purchase_reference,
+                "expiry_date": redemption.expiry_date,
+                "transaction_id": transaction_id
+            }, status=status.HTTP_201_CREATED)
                 
         except ValidationError as e:
             return Response(
@@ -511,17 +560,17 @@ class VoucherPurchaseViewSet(viewsets.ViewSet):
                 if redemption.purchase_status in ['cancelled', 'refunded']:
                     raise ValidationError("Voucher is already cancelled or refunded")
                 
-                # 3. Get user wallet with select_for_update
-                try:
-                    wallet = Wallet.objects.select_for_update().get(user=user)
-                except Wallet.DoesNotExist:
-                    raise ValidationError("User wallet not found for refund")
-                
-                # 4. Refund the purchase
+                # 3. Refund the purchase (credits the wallet atomically)
                 try:
                     redemption.refund_purchase(reason=reason)
                 except ValidationError as e:
                     raise ValidationError(f"Refund failed: {str(e)}")
+
+                # 4. Read the balance after the refund
+                try:
+                    wallet = Wallet.objects.only("balance").get(user=user)
+                except Wallet.DoesNotExist:
+                    raise ValidationError("User wallet not found for refund")
                 
                 return Response({
                     "message": "Voucher purchase refunded successfully",
@@ -553,14 +602,34 @@ class UserVoucherViewSet(viewsets.ReadOnlyModelViewSet):
     """Manage user's purchased vouchers"""
     serializer_class = UserVoucherSerializer
     permission_classes = [permissions.IsAuthenticated, IsAPIKEYAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ["purchase_status", "is_gift_voucher"]
     ordering = ["-purchased_at"]
+    cursor_ordering = ("-purchased_at", "-id")
+
+    # Everything UserVoucherSerializer and PurchaseHistorySerializer read, so a
+    # page of redemptions is one query joined to voucher, type and merchant
+    related_fields = ("voucher__voucher_type", "voucher__merchant")
+    only_fields = (
+        "id", "user_id", "voucher_id", "purchased_at", "redeemed_at", "is_active",
+        "is_gift_voucher", "purchase_cost", "purchase_reference", "purchase_status",
+        "expiry_date", "redemption_location", "redemption_notes",
+        "voucher__id", "voucher__title", "voucher__message", "voucher__image", "voucher__image_derivatives",
+        "voucher__percentage_value", "voucher__flat_amount", "voucher__product_name",
+        "voucher__voucher_type__id", "voucher__voucher_type__name",
+        "voucher__merchant__id", "voucher__merchant__business_name",
+        "voucher__merchant__banner_image", "voucher__merchant__logo", "voucher__merchant__image_derivatives",
+        "voucher__merchant__address", "voucher__merchant__city", "voucher__merchant__state",
+    )
 
     def get_queryset(self):
         """Get user's purchased vouchers"""
-        return UserVoucherRedemption.objects.filter(user=self.request.user)
+        return (
+            UserVoucherRedemption.objects.filter(user=self.request.user)
+            .select_related(*self.related_fields)
+            .only(*self.only_fields)
+        )
 
     @action(detail=False, methods=["get"], url_path="active")
     def active_vouchers(self, request):
@@ -636,31 +705,24 @@ class UserVoucherViewSet(viewsets.ReadOnlyModelViewSet):
         if date_to:
             history = history.filter(purchased_at__lte=date_to)
         
+        history = history.order_by('-purchased_at', '-id')
+        page = self.paginate_queryset(history)
+        if page is not None:
+            serializer = PurchaseHistorySerializer(page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
+
         serializer = PurchaseHistorySerializer(history, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"], url_path="summary")
     def purchase_summary(self, request):
         """Get purchase summary statistics"""
-        user_vouchers = self.get_queryset()
-        
-        summary = {
-            "total_purchases": user_vouchers.count(),
-            "total_spent": sum(v.purchase_cost for v in user_vouchers),
-            "active_vouchers": user_vouchers.filter(
-                purchase_status='purchased',
-                redeemed_at__isnull=True
-            ).exclude(expiry_date__lt=timezone.now()).count(),
-            "redeemed_vouchers": user_vouchers.filter(purchase_status='redeemed').count(),
-            "expired_vouchers": user_vouchers.filter(
-                purchase_status='purchased',
-                expiry_date__lt=timezone.now()
-            ).count(),
-            "cancelled_vouchers": user_vouchers.filter(purchase_status='cancelled').count(),
-            "refunded_vouchers": user_vouchers.filter(purchase_status='refunded').count(),
-            "total_refunds": sum(v.purchase_cost for v in user_vouchers.filter(purchase_status='refunded')),
-            "gift_cards": user_vouchers.filter(is_gift_voucher=True).count()
-        }
+        if settings.VOUCHER_STATS_MATERIALIZED:
+            summary = UserVoucherStats.get_for_user(request.user.pk).as_summary()
+        else:
+            summary = UserVoucherStats.aggregate(
+                UserVoucherRedemption.objects.filter(user=request.user)
+            )
         
         return Response(summary)
 
@@ -683,43 +745,27 @@ class WhatsAppContactViewSet(viewsets.ModelViewSet):
         try:
             contacts_data = request.data.get('contacts', [])
            
-            if not contacts_data:
+            if not contacts_data or not isinstance(contacts_data, list):
                 return Response(
                     {"error": "No contacts provided"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
            
-            # Clear existing contacts for this user
-            WhatsAppContact.objects.filter(user=request.user).delete()
-           
-            # Create new contacts
-            created_contacts = []
-            for contact in contacts_data:
-                name = contact.get('name', '')
-                phone_number = contact.get('phone_number', '')
-               
-                if phone_number:
-                    # Check if contact is on WhatsApp (implement your WhatsApp API check here)
-                    is_on_whatsapp = self.check_whatsapp_status(phone_number)
-                   
-                    contact_obj = WhatsAppContact.objects.create(
-                        user=request.user,
-                        name=name,
-                        phone_number=phone_number,
-                        is_on_whatsapp=is_on_whatsapp
-                    )
-                    created_contacts.append(contact_obj)
+            # Diff against stored contacts; statuses come from the shared cache or the provider
+            result = whatsapp.sync_contacts(request.user, contacts_data)
            
             # Return only WhatsApp contacts
             whatsapp_contacts = WhatsAppContact.objects.filter(
                 user=request.user,
                 is_on_whatsapp=True
-            )
+            ).order_by('name')
            
             serializer = self.get_serializer(whatsapp_contacts, many=True)
+            synced = result["created"] + result["updated"] + result["unchanged"]
            
             return Response({
-                "message": f"Synced {len(created_contacts)} contacts, {len(whatsapp_contacts)} on WhatsApp",
+                "message": f"Synced {synced} contacts, {len(serializer.data)} on WhatsApp",
+                "sync": result,
                 "whatsapp_contacts": serializer.data
             })
            
@@ -729,22 +775,6 @@ class WhatsAppContactViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def check_whatsapp_status(self, phone_number):
-        """Check if a phone number is registered on WhatsApp"""
-        # This is a placeholder - implement based on your WhatsApp provider
-        # Example: Use WhatsApp Business API to check number status
-       
-        try:
-            # api_url = "https://your-whatsapp-api.com/check"
-            # payload = {"phone": phone_number}
-            # response = requests.post(api_url, json=payload)
-            # return response.json().get('is_whatsapp', False)
-           
-            # For now, return True as placeholder (you should implement actual check)
-            return True
-        except Exception:
-            return False
-
     @action(detail=False, methods=["get"], url_path="whatsapp-contacts")
     def whatsapp_contacts(self, request):
         """Get only WhatsApp contacts"""
@@ -781,20 +811,36 @@ class AdvertisementViewSet(viewsets.ModelViewSet):
             raise ValidationError("You can only create advertisements for your own vouchers")
         serializer.save()
 
+    AD_DEFAULT_LIMIT = 10
+    AD_MAX_LIMIT = 50
+
+    def _ad_limit(self, request):
+        try:
+            return min(max(int(request.query_params.get('limit', self.AD_DEFAULT_LIMIT)), 1), self.AD_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError("limit must be a number")
+
+    def _ad_response(self, request, ads):
+        # Index payloads are shared between requests: copy before making URLs absolute
+        data = []
+        for ad in ads:
+            ad = dict(ad)
+            for field in ('banner_image', 'banner_thumbnail'):
+                if ad.get(field):
+                    ad[field] = request.build_absolute_uri(ad[field])
+            data.append(ad)
+        ad_stats.record_impressions([ad['id'] for ad in data])
+        return Response(data)
+
     @action(detail=False, methods=["get"], url_path="active")
     def active_advertisements(self, request):
-        """Get active advertisements"""
+        """Get up to `limit` running advertisements, rotated by weight"""
         try:
-            current_date = timezone.now().date()
-            active_ads = Advertisement.objects.filter(
-                start_date__lte=current_date,
-                end_date__gte=current_date,
-                is_active=True
-            ).order_by('-create_time')
-           
-            serializer = self.get_serializer(active_ads, many=True)
-            return Response(serializer.data)
+            ads = advertisement_index.serve(self._ad_limit(request))
+            return self._ad_response(request, ads)
            
+        except ValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": "Failed to fetch active advertisements"},
@@ -803,7 +849,7 @@ class AdvertisementViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="by-location")
     def advertisements_by_location(self, request):
-        """Get advertisements by city and state"""
+        """Get up to `limit` advertisements running in a city and state, rotated by weight"""
         try:
             city = request.query_params.get('city')
             state = request.query_params.get('state')
@@ -814,20 +860,70 @@ class AdvertisementViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
            
-            current_date = timezone.now().date()
-            location_ads = Advertisement.objects.filter(
-                city__iexact=city,
-                state__iexact=state,
-                start_date__lte=current_date,
-                end_date__gte=current_date,
-                is_active=True
-            ).order_by('-create_time')
-           
-            serializer = self.get_serializer(location_ads, many=True)
-            return Response(serializer.data)
+            # Served from the in-process index; matching ignores case and extra spaces
+            ads = advertisement_index.serve(self._ad_limit(request), state=state, city=city)
+            return self._ad_response(request, ads)
            
+        except ValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": "Failed to fetch advertisements by location"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+    @action(detail=True, methods=["post"], url_path="click")
+    def record_click(self, request, pk=None):
+        """Count a click on a served advertisement"""
+        # Any user can click any ad, so this skips get_object() and its merchant filter
+        try:
+            advertisement_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({"error": "Advertisement not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not advertisement_index.is_live(advertisement_id):
+            return Response({"error": "Advertisement not found"}, status=status.HTTP_404_NOT_FOUND)
+        ad_stats.record_click(advertisement_id)
+        return Response({"message": "Click recorded"})
+
+    STATS_DEFAULT_DAYS = 7
+    STATS_MAX_DAYS = 90
+
+    @action(detail=True, methods=["get"], url_path="stats")
+    def stats(self, request, pk=None):
+        """
+        Impressions, clicks and click-through rate of one of the merchant's
+        advertisements over the last `days` days, per `granularity` (hour or day).
+        Read from the hourly rollups only, so the current hour lags by up to one flush.
+        """
+        advertisement = self.get_object()
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in ('hour', 'day'):
+            return Response({"error": "granularity must be hour or day"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = min(max(int(request.query_params.get('days', self.STATS_DEFAULT_DAYS)), 1), self.STATS_MAX_DAYS)
+        except ValueError:
+            return Response({"error": "days must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.now() - timedelta(days=days)
+        rollups = AdvertisementHourlyStats.objects.filter(advertisement=advertisement, hour__gte=since)
+        if granularity == 'day':
+            rollups = rollups.annotate(period=TruncDate('hour')).values('period')
+        else:
+            rollups = rollups.values(period=F('hour'))
+        series = [
+            {"period": row['period'], "impressions": row['total_impressions'], "clicks": row['total_clicks']}
+            for row in rollups.annotate(
+                total_impressions=Sum('impressions'), total_clicks=Sum('clicks')
+            ).order_by('period')
+        ]
+        impressions = sum(row['impressions'] for row in series)
+        clicks = sum(row['clicks'] for row in series)
+        return Response({
+            "advertisement": advertisement.pk,
+            "granularity": granularity,
+            "days": days,
+            "impressions": impressions,
+            "clicks": clicks,
+            "ctr": round(clicks / impressions, 4) if impressions else 0.0,
+            "series": series,
+        })
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VoucherConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = __name__.rpartition(".")[0]
+
+    def ready(self):
+        import freelancing.voucher.signals
@@ -0,0 +1,250 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+MERCHANT = "merchant"
+VOUCHER = "voucher"
+
+
+class AutocompleteIndex:
+    """
+    Process-local, typo-tolerant autocomplete over merchant business names
+    and public voucher titles.
+
+    The index is built lazily on first use, synced incrementally (rows whose
+    update_time moved) every AUTOCOMPLETE_SYNC_INTERVAL seconds, rebuilt in
+    full every AUTOCOMPLETE_REBUILD_INTERVAL seconds to drop hard-deleted
+    rows, and patched immediately by signals in the process that saved the
+    row. Between syncs a lookup never touches the database: word prefixes
+    are answered from a sorted token list with bisect, typos by RapidFuzz
+    over the distinct indexed words.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None  # (kind, id) -> {"label", "merchant_id"}
+        self._choices = {}  # (kind, id) -> normalised label
+        self._tokens = []  # sorted (token, kind, id)
+        self._token_counts = {}  # token -> number of entries using it
+        self._vocabulary = None  # distinct tokens, for fuzzy matching
+        self._synced_at = None
+        self._next_sync = 0
+        self._next_rebuild = 0
+
+    @staticmethod
+    def _merchant_rows(queryset):
+        return queryset.filter(is_active=True, is_delete=False).values_list("id", "business_name")
+
+    @staticmethod
+    def _voucher_rows(queryset):
+        return queryset.filter(is_active=True, is_delete=False, is_gift_card=False).values_list(
+            "id", "title", "merchant_id"
+        )
+
+    def _put(self, key, label, merchant_id=None):
+        self._remove(key)
+        normalised = default_process(label or "")
+        if not normalised:
+            return
+        self._entries[key] = {"label": label, "merchant_id": merchant_id}
+        self._choices[key] = normalised
+        for token in set(normalised.split()):
+            insort(self._tokens, (token, *key))
+            self._count_token(token, 1)
+
+    def _remove(self, key):
+        normalised = self._choices.pop(key, None)
+        self._entries.pop(key, None)
+        if normalised is None:
+            return
+        for token in set(normalised.split()):
+            position = bisect_left(self._tokens, (token, *key))
+            if position < len(self._tokens) and self._tokens[position] == (token, *key):
+                del self._tokens[position]
+            self._count_token(token, -1)
+
+    def _count_token(self, token, delta):
+        count = self._token_counts.get(token, 0) + delta
+        if count > 0:
+            if token not in self._token_counts:
+                self._vocabulary = None
+            self._token_counts[token] = count
+        else:
+            self._token_counts.pop(token, None)
+            self._vocabulary = None
+
+    def _load(self, merchants, vouchers):
+        rows = [((MERCHANT, merchant_id), name, None) for merchant_id, name in merchants]
+        rows += [((VOUCHER, voucher_id), title, merchant_id) for voucher_id, title, merchant_id in vouchers]
+        tokens = []
+        for key, label, merchant_id in rows:
+            normalised = default_process(label or "")
+            if not normalised:
+                continue
+            self._entries[key] = {"label": label, "merchant_id": merchant_id}
+            self._choices[key] = normalised
+            tokens.extend((token, *key) for token in set(normalised.split()))
+        # One sort instead of an insort per token
+        tokens.sort()
+        self._tokens = tokens
+        for token, _, _ in tokens:
+            self._token_counts[token] = self._token_counts.get(token, 0) + 1
+        self._vocabulary = None
+
+    def rebuild(self):
+        from freelancing.custom_auth.models import MerchantProfile
+        from freelancing.voucher.models import Voucher
+
+        with self._lock:
+            self._entries, self._choices, self._tokens, self._token_counts = {}, {}, [], {}
+            self._synced_at = timezone.now()
+            self._load(
+                self._merchant_rows(MerchantProfile.objects.all()),
+                self._voucher_rows(Voucher.objects.all()),
+            )
+            self._next_sync = time.monotonic() + getattr(settings, "AUTOCOMPLETE_SYNC_INTERVAL", 60)
+            self._next_rebuild = time.monotonic() + getattr(settings, "AUTOCOMPLETE_REBUILD_INTERVAL", 3600)
+
+    def sync(self):
+        """Apply rows changed since the last sync; deactivated rows are removed"""
+        from freelancing.custom_auth.models import MerchantProfile
+        from freelancing.voucher.models import Voucher
+
+        with self._lock:
+            now = timezone.now()
+            # Overlap slightly so rows committed during the last sync are not missed
+            since = self._synced_at - timedelta(seconds=5)
+            for merchant in MerchantProfile.objects.filter(update_time__gte=since).values(
+                "id", "business_name", "is_active", "is_delete"
+            ):
+                self.apply_merchant_values(merchant)
+            for voucher in Voucher.objects.filter(update_time__gte=since).values(
+                "id", "title", "merchant_id", "is_active", "is_delete", "is_gift_card"
+            ):
+                self.apply_voucher_values(voucher)
+            self._synced_at = now
+            self._next_sync = time.monotonic() + getattr(settings, "AUTOCOMPLETE_SYNC_INTERVAL", 60)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._entries is None or now >= self._next_rebuild:
+            self.rebuild()
+        elif now >= self._next_sync:
+            self.sync()
+
+    def apply_voucher_values(self, voucher):
+        key = (VOUCHER, voucher["id"])
+        if voucher["is_active"] and not voucher["is_delete"] and not voucher["is_gift_card"]:
+            self._put(key, voucher["title"], voucher["merchant_id"])
+        else:
+            self._remove(key)
+
+    def apply_merchant_values(self, merchant):
+        key = (MERCHANT, merchant["id"])
+        if merchant["is_active"] and not merchant["is_delete"]:
+            self._put(key, merchant["business_name"])
+        else:
+            self._remove(key)
+
+    def update_voucher(self, voucher):
+        if self._entries is None:
+            return
+        with self._lock:
+            self.apply_voucher_values({
+                "id": voucher.pk, "title": voucher.title, "merchant_id": voucher.merchant_id,
+                "is_active": voucher.is_active, "is_delete": voucher.is_delete,
+                "is_gift_card": voucher.is_gift_card,
+            })
+
+    def update_merchant(self, merchant):
+        if self._entries is None:
+            return
+        with self._lock:
+            self.apply_merchant_values({
+                "id": merchant.pk, "business_name": merchant.business_name,
+                "is_active": merchant.is_active, "is_delete": merchant.is_delete,
+            })
+
+    def remove(self, kind, pk):
+        if self._entries is None:
+            return
+        with self._lock:
+            self._remove((kind, pk))
+
+    def _result(self, key, score):
+        entry = self._entries[key]
+        result = {"type": key[0], "id": key[1], "label": entry["label"], "score": round(score, 1)}
+        if key[0] == VOUCHER:
+            merchant = self._entries.get((MERCHANT, entry["merchant_id"]))
+            result["merchant_name"] = merchant["label"] if merchant else None
+        return result
+
+    def search(self, query, limit=10, score_cutoff=75):
+        """
+        Entries with a word starting with the last typed word (and containing
+        the whole query) score 100. Otherwise every query word is matched
+        against the distinct indexed words with RapidFuzz, and an entry scores
+        the mean of its best match per query word. Matching words rather than
+        whole labels keeps the fuzzy pass proportional to the vocabulary.
+        """
+        self._ensure_fresh()
+        query = default_process(query or "")
+        if not query:
+            return []
+
+        with self._lock:
+            return self._search(query, limit, score_cutoff)
+
+    def _keys_with_token(self, token, prefix=False):
+        position = bisect_left(self._tokens, (token,))
+        while position < len(self._tokens):
+            indexed, kind, pk = self._tokens[position]
+            if indexed != token and not (prefix and indexed.startswith(token)):
+                break
+            yield kind, pk
+            position += 1
+
+    def _search(self, query, limit, score_cutoff):
+        results = {}
+        words = query.split()
+        for key in self._keys_with_token(words[-1], prefix=True):
+            if len(words) == 1 or query in self._choices[key]:
+                results.setdefault(key, 100.0)
+                if len(results) >= limit:
+                    break
+
+        if len(results) < limit:
+            if self._vocabulary is None:
+                self._vocabulary = list(self._token_counts)
+            word_scores = {}
+            for index, word in enumerate(words):
+                for token, score, _ in process.extract(
+                    word, self._vocabulary, scorer=fuzz.ratio, processor=None,
+                    limit=5, score_cutoff=score_cutoff,
+                ):
+                    for key in self._keys_with_token(token):
+                        best = word_scores.setdefault(key, [0.0] * len(words))
+                        best[index] = max(best[index], score)
+            for key, best in word_scores.items():
+                score = sum(best) / len(words)
+                if score >= score_cutoff:
+                    results.setdefault(key, score)
+
+        ranked = sorted(results.items(), key=lambda item: -item[1])[:limit]
+        return [self._result(key, score) for key, score in ranked]
+
+    def reset(self):
+        with self._lock:
+            self._entries = None
+            self._choices, self._tokens, self._token_counts = {}, [], {}
+            self._vocabulary = None
+            self._synced_at = None
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,119 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+
+from freelancing.voucher.models import Voucher, VoucherRedemptionCounterShard
+from freelancing.voucher.trending import record_redemption
+
+
+def _shard_count():
+    return getattr(settings, "VOUCHER_REDEMPTION_COUNTER_SHARDS", 1)
+
+
+def _has_cap(voucher):
+    # A count of 0 or None means unlimited, as everywhere else in the app
+    return bool(voucher.count)
+
+
+def increment_redemption_count(voucher, enforce_cap=True):
+    """
+    Atomically add one redemption to a voucher.
+
+    Capped vouchers use a single conditional
+    UPDATE ... SET redemption_count = redemption_count + 1 WHERE redemption_count < count,
+    so the cap holds under concurrency without reading the row first.
+    Uncapped vouchers go to a random counter shard when
+    VOUCHER_REDEMPTION_COUNTER_SHARDS > 1.
+
+    Returns False when the cap has been reached.
+    """
+    shards = _shard_count()
+    if shards > 1 and not _has_cap(voucher):
+        _increment_shard(voucher.pk, random.randrange(shards))
+        record_redemption(voucher)
+        return True
+
+    queryset = Voucher.objects.filter(pk=voucher.pk)
+    if enforce_cap:
+        queryset = queryset.filter(
+            Q(count__isnull=True) | Q(count=0) | Q(redemption_count__lt=F("count"))
+        )
+    if queryset.update(redemption_count=F("redemption_count") + 1) != 1:
+        return False
+    record_redemption(voucher)
+    return True
+
+
+def reserve_stock(voucher):
+    """
+    Take one unit of a voucher's stock for a purchase with a single conditional
+    UPDATE ... SET sold_count = sold_count + 1 WHERE sold_count < count.
+    Call it inside the purchase transaction so a failed purchase gives it back.
+
+    Returns False when the voucher is sold out.
+    """
+    return Voucher.objects.filter(
+        Q(count__isnull=True) | Q(count=0) | Q(sold_count__lt=F("count")),
+        pk=voucher.pk,
+    ).update(sold_count=F("sold_count") + 1) == 1
+
+
+def release_stock(voucher_id, quantity=1):
+    """Give back stock taken by purchases that were cancelled, refunded or expired"""
+    Voucher.objects.filter(pk=voucher_id).update(
+        sold_count=Greatest(F("sold_count") - quantity, 0)
+    )
+
+
+def _increment_shard(voucher_id, shard):
+    shard_rows = VoucherRedemptionCounterShard.objects.filter(voucher_id=voucher_id, shard=shard)
+    if shard_rows.update(count=F("count") + 1):
+        return
+    try:
+        with transaction.atomic():
+            VoucherRedemptionCounterShard.objects.create(voucher_id=voucher_id, shard=shard, count=1)
+    except IntegrityError:
+        # Another request created the shard first
+        shard_rows.update(count=F("count") + 1)
+
+
+def get_redemption_count(voucher):
+    """Redemption count including increments not yet reconciled"""
+    if _shard_count() <= 1:
+        return voucher.redemption_count
+    pending = voucher.redemption_counter_shards.aggregate(total=Sum("count"))["total"]
+    return voucher.redemption_count + (pending or 0)
+
+
+def reconcile_redemption_counters():
+    """
+    Fold counter shards into Voucher.redemption_count, one short transaction
+    per voucher. Returns the number of redemptions folded.
+    """
+    voucher_ids = (
+        VoucherRedemptionCounterShard.objects.filter(count__gt=0)
+        .values_list("voucher_id", flat=True)
+        .distinct()
+    )
+    folded = 0
+    for voucher_id in list(voucher_ids):
+        with transaction.atomic():
+            shards = list(
+                VoucherRedemptionCounterShard.objects.select_for_update().filter(
+                    voucher_id=voucher_id, count__gt=0
+                )
+            )
+            total = sum(shard.count for shard in shards)
+            if not total:
+                continue
+            Voucher.objects.filter(pk=voucher_id).update(
+                redemption_count=F("redemption_count") + total
+            )
+            VoucherRedemptionCounterShard.objects.filter(
+                pk__in=[shard.pk for shard in shards]
+            ).update(count=0)
+            folded += total
+    return folded
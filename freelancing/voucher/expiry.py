@@ -0,0 +1,123 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from freelancing.voucher.counters import release_stock
+from freelancing.voucher.models import UserVoucherRedemption, UserVoucherStats
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "voucher_expiry:lock"
+
+
+def _batch_size():
+    return getattr(settings, "VOUCHER_EXPIRY_BATCH_SIZE", 1000)
+
+
+def _overdue(cutoff):
+    return UserVoucherRedemption.objects.filter(
+        purchase_status='purchased',
+        expiry_date__lt=cutoff,
+        redeemed_at__isnull=True,
+    )
+
+
+def _expiry_note(cutoff):
+    # Appending to NULL with || yields NULL, so NULL/empty notes get the note alone
+    note = f"Auto-expired on {cutoff}"
+    return Case(
+        When(Q(redemption_notes__isnull=True) | Q(redemption_notes=''), then=Value(note)),
+        default=Concat(F('redemption_notes'), Value(f" | {note}")),
+        output_field=TextField(),
+    )
+
+
+def expire_overdue_redemptions(batch_size=None, dry_run=False, cutoff=None, on_chunk=None):
+    """
+    Expire purchased, unredeemed vouchers whose expiry date has passed.
+
+    Expired purchases give their voucher stock back (see release_stock).
+    Rows are walked in (expiry_date, id) order, which the partial
+    uvr_purchased_expiry_idx index serves, and each chunk of `batch_size`
+    rows is locked, updated and committed in its own short transaction.
+    Expired rows no longer match the filter, so a run that crashes part way
+    is resumed by simply running again. Rows locked by a concurrent
+    redeem/refund are skipped and picked up by the next run.
+
+    `on_chunk(chunk_number, rows, seconds)` is called after every chunk.
+    Returns run metrics: rows expired, chunks and per-chunk timings.
+    """
+    batch_size = batch_size or _batch_size()
+    cutoff = cutoff or timezone.now()
+    metrics = {"expired": 0, "chunks": 0, "chunk_seconds": [], "dry_run": dry_run}
+    started = time.monotonic()
+    position = None
+
+    while True:
+        chunk_started = time.monotonic()
+        with transaction.atomic():
+            queryset = _overdue(cutoff)
+            if position is not None:
+                expiry_date, pk = position
+                queryset = queryset.filter(
+                    Q(expiry_date__gt=expiry_date) | Q(expiry_date=expiry_date, id__gt=pk)
+                )
+            if not dry_run:
+                queryset = queryset.select_for_update(skip_locked=True)
+            rows = list(
+                queryset.order_by('expiry_date', 'id').values_list(
+                    'id', 'user_id', 'expiry_date', 'voucher_id'
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            if not dry_run:
+                UserVoucherRedemption.objects.filter(id__in=[row[0] for row in rows]).update(
+                    is_active=False,
+                    purchase_status='expired',
+                    redemption_notes=_expiry_note(cutoff),
+                    update_time=timezone.now(),
+                )
+                for user_id, user_count in Counter(row[1] for row in rows).items():
+                    UserVoucherStats.apply(user_id, purchased_count=-user_count, expired_count=user_count)
+                for voucher_id, voucher_count in sorted(Counter(row[3] for row in rows).items()):
+                    release_stock(voucher_id, voucher_count)
+
+        position = (rows[-1][2], rows[-1][0])
+        seconds = time.monotonic() - chunk_started
+        metrics["expired"] += len(rows)
+        metrics["chunks"] += 1
+        metrics["chunk_seconds"].append(round(seconds, 4))
+        if on_chunk:
+            on_chunk(metrics["chunks"], len(rows), seconds)
+        if len(rows) < batch_size:
+            break
+
+    metrics["seconds"] = round(time.monotonic() - started, 4)
+    logger.info(
+        "Voucher expiry%s: %s rows in %s chunks, %.3fs",
+        " (dry run)" if dry_run else "", metrics["expired"], metrics["chunks"], metrics["seconds"],
+    )
+    return metrics
+
+
+def run_scheduled_expiry(batch_size=None):
+    """
+    Periodic entry point: skips the run when another one still holds the
+    lock so overlapping beat ticks never walk the same rows
+    """
+    if not cache.add(LOCK_KEY, 1, timeout=getattr(settings, "VOUCHER_EXPIRY_LOCK_TIMEOUT", 3600)):
+        logger.info("Voucher expiry already running, skipped")
+        return None
+    try:
+        return expire_overdue_redemptions(batch_size=batch_size)
+    finally:
+        cache.delete(LOCK_KEY)
@@ -0,0 +1,163 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from freelancing.custom_auth.models import ApplicationUser, LoginOtp, WalletHistory
+from freelancing.voucher.models import Advertisement, UserVoucherRedemption, Voucher
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the query plan and timing of the hot filter paths, optionally '
+        'compared with the plan when their index is dropped (inside a rolled back transaction)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help=(
+                'Also explain each query with its index temporarily dropped (PostgreSQL only). '
+                'DROP INDEX holds an ACCESS EXCLUSIVE lock on the table, blocking all reads and '
+                'writes on it until the rolled back transaction ends, i.e. for the whole timing '
+                'loop. Requires --i-know-this-locks; never run it against production.'
+            ),
+        )
+        parser.add_argument(
+            '--i-know-this-locks',
+            action='store_true',
+            dest='i_know_this_locks',
+            help='Confirm that --compare may lock the hot tables',
+        )
+        parser.add_argument(
+            '--lock-timeout',
+            type=int,
+            default=2000,
+            help='Milliseconds --compare waits for the table lock before skipping a case (default: 2000)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Use EXPLAIN ANALYZE (PostgreSQL only)',
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=20,
+            help='Executions per query for the timing (default: 20)',
+        )
+        parser.add_argument(
+            '--only',
+            help='Run only the cases whose label contains this text',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('analyze', 'compare'):
+            if options[option] and connection.vendor != 'postgresql':
+                raise CommandError(f'--{option} is only supported on PostgreSQL')
+        if options['compare'] and not options['i_know_this_locks']:
+            raise CommandError(
+                '--compare locks each hot table for the whole timing loop; '
+                'pass --i-know-this-locks to run it (never against production)'
+            )
+
+        for label, index_name, queryset in self._cases():
+            if options['only'] and options['only'] not in label:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label} [{index_name}]'))
+            self._report(queryset, options)
+
+            if options['compare']:
+                self.stdout.write(self.style.WARNING(f'  without {index_name}:'))
+                try:
+                    with transaction.atomic():
+                        with connection.cursor() as cursor:
+                            # Give up instead of queueing behind (and in front of) live traffic
+                            cursor.execute(f"SET LOCAL lock_timeout = {int(options['lock_timeout'])}")
+                            cursor.execute(f'DROP INDEX {connection.ops.quote_name(index_name)}')
+                        self._report(queryset, options)
+                        raise Rollback
+                except Rollback:
+                    pass
+                except OperationalError as e:
+                    self.stdout.write(self.style.ERROR(f'    skipped, could not lock the table: {e}'))
+
+    def _report(self, queryset, options):
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for line in queryset.explain(**explain_options).splitlines():
+            self.stdout.write(f'    {line}')
+
+        timings = []
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f'    median {statistics.median(timings):.2f} ms over {options["runs"]} runs')
+
+    def _cases(self):
+        now = timezone.now()
+        today = now.date()
+        user = ApplicationUser.objects.order_by('pk').only('pk', 'email').first()
+        user_id = user.pk if user else 0
+        email = user.email if user and user.email else 'nobody@example.com'
+        wallet_history = WalletHistory.objects.order_by('-pk').only('wallet_id').first()
+        wallet_id = wallet_history.wallet_id if wallet_history else 0
+        otp = LoginOtp.objects.order_by('-pk').only('user_mobile').first()
+        mobile = str(otp.user_mobile) if otp else '+910000000000'
+        ad = Advertisement.objects.order_by('-pk').only('city', 'state').first()
+        city, state = (ad.city, ad.state) if ad else ('Mumbai', 'Maharashtra')
+
+        return [
+            (
+                'expiry job', 'uvr_purchased_expiry_idx',
+                UserVoucherRedemption.objects.filter(
+                    purchase_status='purchased', expiry_date__lt=now, redeemed_at__isnull=True
+                ).order_by().values('id'),
+            ),
+            (
+                'my-vouchers tab', 'uvr_user_status_idx',
+                UserVoucherRedemption.objects.filter(
+                    user_id=user_id, purchase_status='purchased'
+                ).order_by('-purchased_at')[:10],
+            ),
+            (
+                'wallet history page', 'wallethistory_wallet_time_idx',
+                WalletHistory.objects.filter(wallet_id=wallet_id).order_by('-create_time', '-id')[:10],
+            ),
+            (
+                'active advertisements', 'ad_active_dates_idx',
+                Advertisement.objects.filter(start_date__lte=today, end_date__gte=today, is_active=True),
+            ),
+            (
+                'advertisements by location', 'ad_location_dates_idx',
+                Advertisement.objects.filter(
+                    city__iexact=city, state__iexact=state,
+                    start_date__lte=today, end_date__gte=today, is_active=True,
+                ),
+            ),
+            (
+                'public voucher list', 'voucher_public_recent_idx',
+                Voucher.objects.filter(is_active=True, is_gift_card=False).order_by('-create_time')[:10],
+            ),
+            (
+                'popular / featured vouchers', 'voucher_popular_idx',
+                Voucher.objects.filter(
+                    is_active=True, is_gift_card=False, redemption_count__gt=0
+                ).order_by('-redemption_count')[:10],
+            ),
+            (
+                'login otp lookup', 'loginotp_mobile_expiry_idx',
+                LoginOtp.objects.filter(user_mobile=mobile, expiration_time__gte=now).order_by('-expiration_time')[:1],
+            ),
+            (
+                'login email lookup', 'user_live_email_upper_idx',
+                ApplicationUser.objects.filter(email__iexact=email, is_active=True, is_delete=False)[:1],
+            ),
+        ]
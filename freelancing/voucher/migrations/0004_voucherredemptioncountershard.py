@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0003_uservoucherredemption"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VoucherRedemptionCounterShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "voucher",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="redemption_counter_shards",
+                        to="voucher.voucher",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("voucher", "shard")},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0011_walletsnapshot"),
+        ("voucher", "0004_voucherredemptioncountershard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserVoucherStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="voucher_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("total_purchases", models.PositiveIntegerField(default=0)),
+                (
+                    "total_spent",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+                ),
+                ("purchased_count", models.IntegerField(default=0)),
+                ("redeemed_count", models.IntegerField(default=0)),
+                ("expired_count", models.IntegerField(default=0)),
+                ("cancelled_count", models.IntegerField(default=0)),
+                ("refunded_count", models.IntegerField(default=0)),
+                (
+                    "total_refunds",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+                ),
+                ("gift_cards", models.PositiveIntegerField(default=0)),
+                ("update_time", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
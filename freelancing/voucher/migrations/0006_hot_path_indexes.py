@@ -0,0 +1,66 @@
+# Generated by Django 4.2 on 2026-10-18 10:14
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0005_uservoucherstats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="advertisement",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["end_date", "start_date"],
+                name="ad_active_dates_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="advertisement",
+            index=models.Index(
+                django.db.models.functions.text.Upper("city"),
+                django.db.models.functions.text.Upper("state"),
+                models.F("end_date"),
+                models.F("start_date"),
+                condition=models.Q(("is_active", True)),
+                name="ad_location_dates_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="uservoucherredemption",
+            index=models.Index(
+                fields=["user", "purchase_status", "-purchased_at"],
+                name="uvr_user_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="uservoucherredemption",
+            index=models.Index(
+                condition=models.Q(("purchase_status", "purchased")),
+                fields=["expiry_date", "redeemed_at"],
+                name="uvr_purchased_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voucher",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_gift_card", False)),
+                fields=["-create_time"],
+                name="voucher_public_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voucher",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_gift_card", False), ("redemption_count__gt", 0)
+                ),
+                fields=["-redemption_count"],
+                name="voucher_popular_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 10:18
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# PostgreSQL only: other databases keep the icontains fallback of VoucherSearchFilter
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS voucher_search_vector_gin ON voucher_voucher USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS voucher_title_trgm_gin ON voucher_voucher USING gin (title gin_trgm_ops)",
+    """
+    UPDATE voucher_voucher AS v
+    SET search_vector =
+        setweight(to_tsvector('english', coalesce(v.title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(m.business_name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(v.message, '')), 'B')
+    FROM custom_auth_merchantprofile AS m
+    WHERE m.id = v.merchant_id
+    """,
+]
+BACKWARD_SQL = [
+    "DROP INDEX IF EXISTS voucher_title_trgm_gin",
+    "DROP INDEX IF EXISTS voucher_search_vector_gin",
+]
+
+
+def run_postgres_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0006_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voucher",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(run_postgres_sql(FORWARD_SQL), run_postgres_sql(BACKWARD_SQL)),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0008_giftcardshare"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="advertisement",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="voucher",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("custom_auth", "0015_image_derivatives"),
+        ("voucher", "0009_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VoucherTrendingScore",
+            fields=[
+                (
+                    "voucher",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="voucher.voucher",
+                    ),
+                ),
+                ("score", models.FloatField(default=0)),
+                ("epoch", models.FloatField(db_index=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="custom_auth.category",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="vouchertrendingscore",
+            index=models.Index(fields=["-score"], name="trending_score_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="vouchertrendingscore",
+            index=models.Index(
+                fields=["category", "-score"], name="trending_category_score_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0010_vouchertrendingscore"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="advertisement",
+            name="weight",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 10:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0011_advertisement_weight"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AdvertisementHourlyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField()),
+                ("impressions", models.PositiveBigIntegerField(default=0)),
+                ("clicks", models.PositiveBigIntegerField(default=0)),
+                (
+                    "advertisement",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_stats",
+                        to="voucher.advertisement",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("advertisement", "hour")},
+            },
+        ),
+    ]
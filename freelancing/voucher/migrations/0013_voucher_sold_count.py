@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_sold_count(apps, schema_editor):
+    Voucher = apps.get_model("voucher", "Voucher")
+    UserVoucherRedemption = apps.get_model("voucher", "UserVoucherRedemption")
+    sold = (
+        UserVoucherRedemption.objects.filter(
+            voucher_id=OuterRef("pk"), purchase_status__in=["purchased", "redeemed"]
+        )
+        .order_by()
+        .values("voucher_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Voucher.objects.update(sold_count=Coalesce(Subquery(sold), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voucher", "0012_advertisementhourlystats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voucher",
+            name="sold_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_sold_count, migrations.RunPython.noop),
+    ]
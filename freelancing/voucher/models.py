@@ -1,10 +1,13 @@
 import uuid
+from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from freelancing.custom_auth.models import MerchantProfile, BaseModel, Category
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import transaction, DatabaseError
+from django.db.models.functions import Coalesce, Upper
 from django.utils import timezone
 from freelancing.custom_auth.models import Wallet
 
@@ -46,6 +49,8 @@ This offer is valid while stocks lasts - McDonald's West and South (Hardcastle R
     terms_conditions = models.TextField("Terms & Conditions", blank=True, default=DEFAULT_TERMS)
     count = models.PositiveIntegerField("Redemption Count", null=True, blank=True)
     image = models.ImageField(upload_to="vouchers/", null=True, blank=True)
+    # Resized copies of image, see freelancing.utils.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     voucher_type = models.ForeignKey(VoucherType, on_delete=models.PROTECT, related_name='vouchers')
 
     # Type Specific Fields
@@ -60,8 +65,13 @@ This offer is valid while stocks lasts - McDonald's West and South (Hardcastle R
 
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='vouchers')
     redemption_count = models.PositiveIntegerField(default=0)
+    # Purchases holding stock (purchased or redeemed); capped by `count` at
+    # purchase and released on cancel, refund and expiry, see counters.reserve_stock
+    sold_count = models.PositiveIntegerField(default=0)
     
     is_gift_card = models.BooleanField(default=False)  # Hide from frontend listing
+    # Weighted title/merchant/message document, maintained by freelancing.voucher.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def get_display_image(self):
         return self.image or self.merchant.banner_image
@@ -71,15 +81,62 @@ This offer is valid while stocks lasts - McDonald's West and South (Hardcastle R
 
     class Meta:
         ordering = ['-create_time']
+        indexes = [
+            # Public listing: active, non gift card vouchers, newest first
+            models.Index(
+                fields=['-create_time'], name='voucher_public_recent_idx',
+                condition=models.Q(is_active=True, is_gift_card=False),
+            ),
+            # Popular / featured: top redeemed non gift card vouchers
+            models.Index(
+                fields=['-redemption_count'], name='voucher_popular_idx',
+                condition=models.Q(is_gift_card=False, redemption_count__gt=0),
+            ),
+        ]
+
+
+class VoucherRedemptionCounterShard(models.Model):
+    """
+    Partial redemption count for an uncapped voucher. Spreading increments
+    over several rows keeps popular vouchers from serializing every
+    redemption on the Voucher row lock; shards are folded back into
+    Voucher.redemption_count by reconcile_redemption_counters.
+    """
+    voucher = models.ForeignKey(Voucher, on_delete=models.CASCADE, related_name='redemption_counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['voucher', 'shard']
+
+    def __str__(self):
+        return f"{self.voucher_id}#{self.shard}: {self.count}"
 
 
 class Advertisement(BaseModel):
     voucher = models.OneToOneField(Voucher, on_delete=models.CASCADE, related_name="advertisement")
     banner_image = models.ImageField(upload_to="advertisements/")
+    # Resized copies of banner_image, see freelancing.utils.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     start_date = models.DateField()
     end_date = models.DateField()
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
+    # Relative share of impressions among the ads running in the same location; 0 pauses the ad
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Running ads, optionally by city/state (matched case-insensitively)
+            models.Index(
+                fields=['end_date', 'start_date'], name='ad_active_dates_idx',
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                Upper('city'), Upper('state'), models.F('end_date'), models.F('start_date'),
+                name='ad_location_dates_idx', condition=models.Q(is_active=True),
+            ),
+        ]
 
     def clean(self):
         if not self.banner_image:
@@ -97,6 +154,60 @@ class WhatsAppContact(BaseModel):
     def __str__(self):
         return f"{self.name} ({'✅' if self.is_on_whatsapp else '❌'})"
 
+
+class GiftCardShare(BaseModel):
+    """One gift card shared with a set of recipients; delivered in the background"""
+    share_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    voucher = models.ForeignKey(Voucher, on_delete=models.CASCADE, related_name='gift_card_shares')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='gift_card_shares')
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('sending', 'Sending'),
+            ('completed', 'Completed'),
+            ('partial', 'Partially delivered'),
+            ('failed', 'Failed')
+        ],
+        default='queued'
+    )
+    total_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Share {self.share_id} of {self.voucher_id} ({self.status})"
+
+
+class GiftCardDelivery(models.Model):
+    """Delivery state of a shared gift card for one recipient"""
+    share = models.ForeignKey(GiftCardShare, on_delete=models.CASCADE, related_name='deliveries')
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('sent', 'Sent'),
+            ('failed', 'Failed')
+        ],
+        default='pending'
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['share', 'phone_number']
+        indexes = [
+            # Worker picks up the deliveries of a share that are still pending
+            models.Index(fields=['share', 'status'], name='giftdelivery_share_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone_number}: {self.status}"
+
 class UserVoucherRedemption(BaseModel):
     """Track which users purchased and redeemed which vouchers"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='voucher_redemptions')
@@ -128,6 +239,15 @@ class UserVoucherRedemption(BaseModel):
     class Meta:
         unique_together = ['user', 'voucher']  # User can only purchase a voucher once
         ordering = ['-purchased_at']
+        indexes = [
+            # My-vouchers tabs: a user's vouchers by status, newest first
+            models.Index(fields=['user', 'purchase_status', '-purchased_at'], name='uvr_user_status_idx'),
+            # Expiry job and expired tab: only rows still in 'purchased' status are indexed
+            models.Index(
+                fields=['expiry_date', 'redeemed_at'], name='uvr_purchased_expiry_idx',
+                condition=models.Q(purchase_status='purchased'),
+            ),
+        ]
    
     def __str__(self):
         return f"{self.user.fullname} purchased {self.voucher.title}"
@@ -144,8 +264,13 @@ class UserVoucherRedemption(BaseModel):
             # Use current time if purchased_at is not set yet
             base_time = self.purchased_at if self.purchased_at else timezone.now()
             self.expiry_date = base_time + timedelta(days=365)
-       
+
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            UserVoucherStats.record_purchase(self)
+            from freelancing.voucher.trending import record_purchase
+            record_purchase(self.voucher)
 
     def redeem(self, location=None, notes=None):
         """Mark voucher as redeemed with atomic transaction"""
@@ -159,6 +284,7 @@ class UserVoucherRedemption(BaseModel):
         try:
             with transaction.atomic():
                 # Update redemption details
+                previous_status = self.purchase_status
                 self.redeemed_at = timezone.now()
                 self.is_active = False
                 self.purchase_status = 'redeemed'
@@ -167,10 +293,13 @@ class UserVoucherRedemption(BaseModel):
                 if notes:
                     self.redemption_notes = notes
                 self.save()
+                UserVoucherStats.record_transition(self, previous_status)
                
-                # Increment voucher redemption count atomically
-                self.voucher.redemption_count = models.F('redemption_count') + 1
-                self.voucher.save(update_fields=['redemption_count'])
+                # Increment voucher redemption count atomically. The cap was
+                # enforced when the voucher was sold (see reserve_stock), so a
+                # validly bought voucher is never refused here.
+                from freelancing.voucher.counters import increment_redemption_count
+                increment_redemption_count(self.voucher, enforce_cap=False)
                
         except DatabaseError as e:
             raise ValidationError("Failed to redeem voucher due to database error")
@@ -199,11 +328,16 @@ class UserVoucherRedemption(BaseModel):
        
         try:
             with transaction.atomic():
+                previous_status = self.purchase_status
                 self.is_active = False
                 self.purchase_status = 'cancelled'
                 if reason:
                     self.redemption_notes = f"Cancelled: {reason}"
                 self.save()
+                UserVoucherStats.record_transition(self, previous_status)
+                if previous_status == 'purchased':
+                    from freelancing.voucher.counters import release_stock
+                    release_stock(self.voucher_id)
                
         except DatabaseError as e:
             raise ValidationError("Failed to cancel voucher due to database error")
@@ -218,15 +352,17 @@ class UserVoucherRedemption(BaseModel):
         try:
             with transaction.atomic():
                 # Update voucher status
+                previous_status = self.purchase_status
                 self.is_active = False
                 self.purchase_status = 'refunded'
                 if reason:
                     self.redemption_notes = f"Refunded: {reason}"
                 self.save()
+                UserVoucherStats.record_transition(self, previous_status)
 
-                # Refund to wallet with atomic transaction
+                # Refund to wallet; credit() is a single atomic F() update
                 try:
-                    wallet = Wallet.objects.select_for_update().get(user=self.user)
+                    wallet = Wallet.objects.get(user=self.user)
                     wallet.credit(
                         self.purchase_cost,
                         note=f"Voucher Refund: {self.voucher.title}",
@@ -236,6 +372,11 @@ class UserVoucherRedemption(BaseModel):
                     raise ValidationError("User wallet not found for refund")
                 except Exception as e:
                     raise ValidationError("Failed to process wallet refund")
+
+                # Expired purchases gave their stock back already
+                if previous_status == 'purchased':
+                    from freelancing.voucher.counters import release_stock
+                    release_stock(self.voucher_id)
                    
         except ValidationError:
             raise
@@ -245,23 +386,11 @@ class UserVoucherRedemption(BaseModel):
             raise ValidationError("Failed to refund voucher")
 
     @classmethod
-    def bulk_expire_vouchers(cls):
-        """Bulk expire vouchers that have passed their expiry date"""
+    def bulk_expire_vouchers(cls, batch_size=None):
+        """Bulk expire vouchers that have passed their expiry date, in short chunked transactions"""
+        from freelancing.voucher.expiry import expire_overdue_redemptions
         try:
-            with transaction.atomic():
-                expired_vouchers = cls.objects.filter(
-                    purchase_status='purchased',
-                    expiry_date__lt=timezone.now(),
-                    redeemed_at__isnull=True
-                )
-               
-                count = expired_vouchers.update(
-                    is_active=False,
-                    purchase_status='expired',
-                    redemption_notes=models.F('redemption_notes') + f" | Auto-expired on {timezone.now()}"
-                )
-               
-                return count
+            return expire_overdue_redemptions(batch_size=batch_size)["expired"]
                
         except DatabaseError as e:
             raise ValidationError("Failed to expire vouchers due to database error")
@@ -280,3 +409,182 @@ class UserVoucherRedemption(BaseModel):
         remaining_days = self.get_remaining_days()
         return remaining_days is not None and remaining_days <= days_threshold
 
+
+class UserVoucherStats(models.Model):
+    """
+    Per-user purchase counters behind the purchase summary, kept up to date
+    incrementally on purchase, redeem, cancel, refund and expiry so the
+    summary is a single primary-key read. Rows are built lazily from
+    UserVoucherRedemption the first time they are needed.
+
+    `purchased_count` covers every purchase that is still in the 'purchased'
+    status; vouchers past their expiry date move to `expired_count` once the
+    expiry job has marked them.
+    """
+    STATUS_FIELDS = {
+        'purchased': 'purchased_count',
+        'redeemed': 'redeemed_count',
+        'expired': 'expired_count',
+        'cancelled': 'cancelled_count',
+        'refunded': 'refunded_count',
+    }
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='voucher_stats')
+    total_purchases = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    purchased_count = models.IntegerField(default=0)
+    redeemed_count = models.IntegerField(default=0)
+    expired_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    refunded_count = models.IntegerField(default=0)
+    total_refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    gift_cards = models.PositiveIntegerField(default=0)
+    update_time = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Voucher stats of user {self.user_id}"
+
+    @staticmethod
+    def aggregate(queryset):
+        """
+        Summary of a UserVoucherRedemption queryset in one conditional
+        aggregate query
+        """
+        now = timezone.now()
+        zero = models.Value(Decimal("0.00"))
+        return queryset.order_by().aggregate(
+            total_purchases=models.Count('id'),
+            total_spent=Coalesce(models.Sum('purchase_cost'), zero),
+            active_vouchers=models.Count(
+                'id',
+                filter=models.Q(purchase_status='purchased', redeemed_at__isnull=True)
+                & (models.Q(expiry_date__isnull=True) | models.Q(expiry_date__gte=now)),
+            ),
+            redeemed_vouchers=models.Count('id', filter=models.Q(purchase_status='redeemed')),
+            expired_vouchers=models.Count(
+                'id', filter=models.Q(purchase_status='purchased', expiry_date__lt=now)
+            ),
+            cancelled_vouchers=models.Count('id', filter=models.Q(purchase_status='cancelled')),
+            refunded_vouchers=models.Count('id', filter=models.Q(purchase_status='refunded')),
+            total_refunds=Coalesce(
+                models.Sum('purchase_cost', filter=models.Q(purchase_status='refunded')), zero
+            ),
+            gift_cards=models.Count('id', filter=models.Q(is_gift_voucher=True)),
+        )
+
+    def as_summary(self):
+        return {
+            "total_purchases": self.total_purchases,
+            "total_spent": self.total_spent,
+            "active_vouchers": self.purchased_count,
+            "redeemed_vouchers": self.redeemed_count,
+            "expired_vouchers": self.expired_count,
+            "cancelled_vouchers": self.cancelled_count,
+            "refunded_vouchers": self.refunded_count,
+            "total_refunds": self.total_refunds,
+            "gift_cards": self.gift_cards,
+        }
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recompute a user's row from UserVoucherRedemption"""
+        redemptions = UserVoucherRedemption.objects.filter(user_id=user_id).order_by()
+        totals = redemptions.aggregate(
+            total_purchases=models.Count('id'),
+            total_spent=Coalesce(models.Sum('purchase_cost'), models.Value(Decimal("0.00"))),
+            total_refunds=Coalesce(
+                models.Sum('purchase_cost', filter=models.Q(purchase_status='refunded')),
+                models.Value(Decimal("0.00")),
+            ),
+            gift_cards=models.Count('id', filter=models.Q(is_gift_voucher=True)),
+            **{
+                field: models.Count('id', filter=models.Q(purchase_status=status))
+                for status, field in cls.STATUS_FIELDS.items()
+            },
+        )
+        stats, _ = cls.objects.update_or_create(user_id=user_id, defaults=totals)
+        return stats
+
+    @classmethod
+    def get_for_user(cls, user_id):
+        return cls.objects.filter(pk=user_id).first() or cls.rebuild(user_id)
+
+    @classmethod
+    def apply(cls, user_id, **deltas):
+        """Add `deltas` to a user's counters with one UPDATE, building the row if missing"""
+        updated = cls.objects.filter(pk=user_id).update(
+            update_time=timezone.now(),
+            **{field: models.F(field) + value for field, value in deltas.items()},
+        )
+        if not updated:
+            # The first rebuild already sees the change that triggered it
+            cls.rebuild(user_id)
+
+    @classmethod
+    def record_purchase(cls, redemption):
+        deltas = {
+            'total_purchases': 1,
+            'total_spent': redemption.purchase_cost,
+            cls.STATUS_FIELDS[redemption.purchase_status]: 1,
+        }
+        if redemption.is_gift_voucher:
+            deltas['gift_cards'] = 1
+        cls.apply(redemption.user_id, **deltas)
+
+    @classmethod
+    def record_transition(cls, redemption, previous_status):
+        if previous_status == redemption.purchase_status:
+            return
+        deltas = {
+            cls.STATUS_FIELDS[previous_status]: -1,
+            cls.STATUS_FIELDS[redemption.purchase_status]: 1,
+        }
+        if redemption.purchase_status == 'refunded':
+            deltas['total_refunds'] = redemption.purchase_cost
+        elif previous_status == 'refunded':
+            deltas['total_refunds'] = -redemption.purchase_cost
+        cls.apply(redemption.user_id, **deltas)
+
+
+class VoucherTrendingScore(models.Model):
+    """
+    Exponentially decayed purchase/redemption activity of a voucher, kept
+    with forward decay: an event at time t adds exp(λ·(t − epoch)), so older
+    events weigh relatively less without touching any other row, and rows
+    that share an epoch rank correctly by `score` alone. The nightly
+    renormalization rescales every row to a new epoch so scores stay small.
+    See freelancing.voucher.trending.
+    """
+    voucher = models.OneToOneField(Voucher, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    # Copy of voucher.category_id so per-category top-N is one index range scan
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    score = models.FloatField(default=0)
+    epoch = models.FloatField(db_index=True)  # Unix time `score` is expressed against
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+            models.Index(fields=['category', '-score'], name='trending_category_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.voucher_id}: {self.score:.4f}"
+
+
+class AdvertisementHourlyStats(models.Model):
+    """
+    Impressions and clicks of an advertisement in one UTC hour. Counts are
+    buffered on the serving path and added here in bulk by
+    flush_advertisement_stats; see freelancing.voucher.ad_stats.
+    """
+    advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='hourly_stats')
+    hour = models.DateTimeField()  # Start of the hour, UTC
+    impressions = models.PositiveBigIntegerField(default=0)
+    clicks = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        # Also serves the stats of one advertisement over a time range
+        unique_together = ['advertisement', 'hour']
+
+    def __str__(self):
+        return f"{self.advertisement_id} @ {self.hour:%Y-%m-%d %H:00}: {self.impressions}/{self.clicks}"
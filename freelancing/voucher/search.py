@@ -0,0 +1,64 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from rest_framework.filters import SearchFilter
+
+from freelancing.custom_auth.models import MerchantProfile
+
+SEARCH_CONFIG = "english"
+
+
+def is_supported():
+    """Full-text search needs PostgreSQL; other databases fall back to icontains"""
+    return connection.vendor == "postgresql"
+
+
+def voucher_search_vector():
+    """
+    Weighted document of a voucher: title and merchant name (A) rank above the
+    message (B). The merchant name is read with a subquery so the expression
+    can be used in Voucher.objects.update().
+    """
+    merchant_name = Subquery(
+        MerchantProfile.objects.filter(pk=OuterRef("merchant_id")).values("business_name")[:1]
+    )
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(merchant_name, Value("")), weight="A", config=SEARCH_CONFIG)
+        + SearchVector("message", weight="B", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Recompute `search_vector` for the given vouchers in one UPDATE"""
+    if not is_supported():
+        return 0
+    return queryset.update(search_vector=voucher_search_vector())
+
+
+class VoucherSearchFilter(SearchFilter):
+    """
+    Relevance-ranked voucher search for `?search=`.
+
+    On PostgreSQL a voucher matches when its GIN-indexed `search_vector`
+    matches the query (websearch syntax) or its title is trigram-similar to
+    it, which catches typos. Results are ordered by text rank, then title
+    similarity. Other databases use the regular icontains SearchFilter over
+    the view's `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = " ".join(self.get_search_terms(request))
+        if not terms or not is_supported():
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+        return (
+            queryset.filter(Q(search_vector=query) | Q(title__trigram_similar=terms))
+            .annotate(
+                search_rank=SearchRank(F("search_vector"), query),
+                title_similarity=TrigramSimilarity("title", terms),
+            )
+            .order_by("-search_rank", "-title_similarity", "-create_time")
+        )
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from freelancing.voucher.models import Voucher, VoucherType, WhatsAppContact, Advertisement, UserVoucherRedemption
+from freelancing.voucher.models import (
+    Voucher, VoucherType, WhatsAppContact, Advertisement, UserVoucherRedemption, GiftCardShare, GiftCardDelivery
+)
 from freelancing.custom_auth.models import MerchantProfile, Category, Wallet, SiteSetting
 from django.core.exceptions import ValidationError
 from decimal import Decimal, InvalidOperation
@@ -7,6 +9,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from phonenumber_field.serializerfields import PhoneNumberField
+from freelancing.utils.images import image_url
 from django.utils import timezone
 
 
@@ -33,27 +36,16 @@ class VoucherListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'uuid', 'title', 'message', 'merchant_name', 'merchant_logo',
             'voucher_type_name', 'display_image', 'voucher_value', 'purchase_cost',
-            'is_purchased', 'can_purchase', 'redemption_count', 'count',
+            'is_purchased', 'can_purchase', 'redemption_count', 'sold_count', 'count',
             'percentage_value', 'percentage_min_bill', 'flat_amount', 'flat_min_bill',
             'product_name', 'product_min_bill', 'category', 'create_time'
         ]
    
     def get_merchant_logo(self, obj):
-        if obj.merchant.logo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.merchant.logo.url)
-            return obj.merchant.logo.url
-        return None
+        return image_url(obj.merchant.logo, "small", self.context.get('request'))
    
     def get_display_image(self, obj):
-        image = obj.get_display_image()
-        if image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(image.url)
-            return image.url
-        return None
+        return image_url(obj.get_display_image(), "medium", self.context.get('request'))
    
     def get_voucher_value(self, obj):
         """Get formatted voucher value based on type"""
@@ -65,22 +57,49 @@ class VoucherListSerializer(serializers.ModelSerializer):
             return f"Free {obj.product_name}"
         return "Special offer"
    
-    def get_purchase_cost(self, obj):
-        """Get cost to purchase this voucher"""
+    @staticmethod
+    def _parse_cost(value):
         try:
-            is_gift_card = obj.is_gift_card
-            cost_key = "gift_card_cost" if is_gift_card else "voucher_cost"
-            voucher_cost_setting = SiteSetting.get_value(cost_key, "10")
-            return Decimal(str(voucher_cost_setting))
+            return Decimal(str(value))
         except (InvalidOperation, ValueError, TypeError):
             # If there's any issue with the setting, use default value
             return Decimal("10")
+
+    @classmethod
+    def get_listing_context(cls, request):
+        """
+        Resolve the per-request values used by every row (purchase costs and
+        wallet balance) once, so a page of vouchers costs a constant number
+        of queries. Pass the result as serializer context.
+        """
+        cost_settings = SiteSetting.get_many(["voucher_cost", "gift_card_cost"], default="10")
+        context = {
+            "purchase_costs": {
+                cost_key: cls._parse_cost(value) for cost_key, value in cost_settings.items()
+            }
+        }
+        if request is not None and request.user.is_authenticated:
+            context["wallet_balance"] = Wallet.objects.filter(
+                user=request.user
+            ).values_list("balance", flat=True).first()
+        return context
+
+    def get_purchase_cost(self, obj):
+        """Get cost to purchase this voucher"""
+        cost_key = "gift_card_cost" if obj.is_gift_card else "voucher_cost"
+        purchase_costs = self.context.get("purchase_costs")
+        if purchase_costs and cost_key in purchase_costs:
+            return purchase_costs[cost_key]
+        return self._parse_cost(SiteSetting.get_value(cost_key, "10"))
    
     def get_is_purchased(self, obj):
         """Check if current user has purchased this voucher"""
         user = self.context.get('request').user
         if not user.is_authenticated:
             return False
+        # Batched listings annotate the queryset with an EXISTS subquery
+        if hasattr(obj, "is_purchased"):
+            return obj.is_purchased
         return UserVoucherRedemption.objects.filter(
             user=user,
             voucher=obj,
@@ -98,10 +117,14 @@ class VoucherListSerializer(serializers.ModelSerializer):
             return False
        
         # Check if voucher has reached its limit
-        if obj.count and obj.redemption_count >= obj.count:
+        if obj.count and obj.sold_count >= obj.count:
             return False
        
         # Check if user has sufficient wallet balance
+        if "wallet_balance" in self.context:
+            balance = self.context["wallet_balance"]
+            return balance is not None and balance >= self.get_purchase_cost(obj)
+
         try:
             wallet = Wallet.objects.get(user=user)
             cost = self.get_purchase_cost(obj)
@@ -109,61 +132,55 @@ class VoucherListSerializer(serializers.ModelSerializer):
         except Wallet.DoesNotExist:
             return False
 
+    @classmethod
+    def apply_purchase_flags(cls, data, request):
+        """
+        Copy of serialized rows with `is_purchased` / `can_purchase` set for the
+        requesting user, for listings whose rows are cached and shared between
+        users. Costs two queries regardless of the number of rows.
+        """
+        rows = [dict(row) for row in data]
+        user = request.user
+        purchased, balance = set(), None
+        if user.is_authenticated:
+            purchased = set(
+                UserVoucherRedemption.objects.filter(
+                    user=user, is_active=True, voucher_id__in=[row['id'] for row in rows]
+                ).values_list('voucher_id', flat=True)
+            )
+            balance = Wallet.objects.filter(user=user).values_list('balance', flat=True).first()
+        for row in rows:
+            row['is_purchased'] = row['id'] in purchased
+            row['can_purchase'] = (
+                user.is_authenticated
+                and not row['is_purchased']
+                and not (row['count'] and row['sold_count'] >= row['count'])
+                and balance is not None
+                and balance >= cls._parse_cost(row['purchase_cost'])
+            )
+        return rows
+
 class VoucherPurchaseSerializer(serializers.Serializer):
-    """Serializer for purchasing vouchers with enhanced validation"""
+    """
+    Serializer for purchasing vouchers.
+
+    Only the voucher itself is checked here. Stock, duplicate purchases and
+    wallet balance are enforced atomically by the purchase pipeline
+    (conditional stock reservation, unique constraint and conditional wallet
+    debit), so they are not pre-checked.
+    """
     voucher_id = serializers.IntegerField()
    
-    def validate_voucher_id(self, value):
-        try:
-            voucher = Voucher.objects.get(id=value, is_active=True)
-            if voucher.is_gift_card:
-                raise serializers.ValidationError("Gift cards cannot be purchased through this endpoint")
-            return value
-        except Voucher.DoesNotExist:
-            raise serializers.ValidationError("Voucher not found or inactive")
-        except Exception as e:
-            raise serializers.ValidationError("Error validating voucher")
-   
     def validate(self, data):
-        user = self.context['request'].user
-        voucher_id = data['voucher_id']
-       
         try:
-            voucher = Voucher.objects.get(id=voucher_id)
-           
-            # Check if already purchased
-            if UserVoucherRedemption.objects.filter(user=user, voucher=voucher).exists():
-                raise serializers.ValidationError("You have already purchased this voucher")
-           
-            # Check if voucher has reached its limit
-            if voucher.count and voucher.redemption_count >= voucher.count:
-                raise serializers.ValidationError("Voucher is out of stock")
-           
-            # Check wallet balance
-            try:
-                wallet = Wallet.objects.get(user=user)
-                # Get voucher cost from settings with better error handling
-                voucher_cost_setting = SiteSetting.get_value("voucher_cost", "10")
-                cost = Decimal(str(voucher_cost_setting))
-                if wallet.balance < cost:
-                    raise serializers.ValidationError(
-                        f"Insufficient balance. Required: ₹{cost}, Available: ₹{wallet.balance}"
-                    )
-            except Wallet.DoesNotExist:
-                raise serializers.ValidationError("Wallet not found")
-            except (InvalidOperation, ValueError, TypeError):
-                # If there's any issue with the setting, use default value
-                cost = Decimal("10")
-                if wallet.balance < cost:
-                    raise serializers.ValidationError(
-                        f"Insufficient balance. Required: ₹{cost}, Available: ₹{wallet.balance}"
-                    )
-           
+            voucher = Voucher.objects.get(id=data['voucher_id'], is_active=True)
         except Voucher.DoesNotExist:
-            raise serializers.ValidationError("Voucher not found")
-        except Exception as e:
-            raise serializers.ValidationError("Error validating purchase request")
-       
+            raise serializers.ValidationError("Voucher not found or inactive")
+
+        if voucher.is_gift_card:
+            raise serializers.ValidationError("Gift cards cannot be purchased through this endpoint")
+
+        data['voucher'] = voucher
         return data
 
 class UserVoucherSerializer(serializers.ModelSerializer):
@@ -199,13 +216,7 @@ class UserVoucherSerializer(serializers.ModelSerializer):
         return "Special offer"
    
     def get_display_image(self, obj):
-        image = obj.voucher.get_display_image()
-        if image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(image.url)
-            return image.url
-        return None
+        return image_url(obj.voucher.get_display_image(), "medium", self.context.get('request'))
 
     def get_days_until_expiry(self, obj):
         """Calculate days until voucher expires"""
@@ -325,21 +336,10 @@ class PurchaseHistorySerializer(serializers.ModelSerializer):
         }
    
     def get_voucher_image(self, voucher):
-        image = voucher.get_display_image()
-        if image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(image.url)
-            return image.url
-        return None
+        return image_url(voucher.get_display_image(), "medium", self.context.get('request'))
    
     def get_merchant_logo(self, merchant):
-        if merchant.logo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(merchant.logo.url)
-            return merchant.logo.url
-        return None
+        return image_url(merchant.logo, "small", self.context.get('request'))
 
 
 class VoucherCreateSerializer(serializers.ModelSerializer):
@@ -451,17 +451,39 @@ class GiftCardShareSerializer(serializers.Serializer):
         return value
 
 
+class GiftCardDeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GiftCardDelivery
+        fields = ['phone_number', 'status', 'attempts', 'error', 'sent_at']
+
+
+class GiftCardShareStatusSerializer(serializers.ModelSerializer):
+    voucher_id = serializers.IntegerField(read_only=True)
+    deliveries = GiftCardDeliverySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = GiftCardShare
+        fields = [
+            'share_id', 'voucher_id', 'status', 'total_count', 'sent_count', 'failed_count',
+            'create_time', 'started_at', 'completed_at', 'deliveries'
+        ]
+
+
 class AdvertisementSerializer(serializers.ModelSerializer):
     voucher_title = serializers.CharField(source='voucher.title', read_only=True)
     merchant_name = serializers.CharField(source='voucher.merchant.business_name', read_only=True)
+    banner_thumbnail = serializers.SerializerMethodField()
    
     class Meta:
         model = Advertisement
         fields = [
-            'id', 'voucher', 'voucher_title', 'merchant_name', 'banner_image',
-            'start_date', 'end_date', 'city', 'state'
+            'id', 'voucher', 'voucher_title', 'merchant_name', 'banner_image', 'banner_thumbnail',
+            'start_date', 'end_date', 'city', 'state', 'weight'
         ]
-        read_only_fields = ['voucher_title', 'merchant_name']
+        read_only_fields = ['voucher_title', 'merchant_name', 'weight']
+
+    def get_banner_thumbnail(self, obj):
+        return image_url(obj.banner_image, "medium", self.context.get('request'))
 
     def validate(self, data):
         """Validate advertisement dates"""
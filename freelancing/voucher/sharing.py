@@ -0,0 +1,139 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from freelancing.voucher.models import GiftCardDelivery, GiftCardShare
+from freelancing.voucher.whatsapp import chunks, get_message_provider
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'partial', 'failed')
+
+
+def gift_card_message(voucher):
+    if voucher.voucher_type.name == 'percentage':
+        value = f"{voucher.percentage_value}% off"
+    elif voucher.voucher_type.name == 'flat':
+        value = f"₹{voucher.flat_amount} off"
+    elif voucher.voucher_type.name == 'product':
+        value = f"Free {voucher.product_name}"
+    else:
+        value = "Special offer"
+    return f"You've received a gift card from {voucher.merchant.business_name}: {voucher.title} ({value})"
+
+
+def create_share(user, voucher, phone_numbers):
+    """
+    Record a share with one pending delivery per recipient and enqueue its
+    delivery once the transaction commits
+    """
+    from freelancing.voucher.tasks import deliver_gift_card_share
+
+    phone_numbers = list(dict.fromkeys(phone_numbers))
+    with transaction.atomic():
+        share = GiftCardShare.objects.create(user=user, voucher=voucher, total_count=len(phone_numbers))
+        GiftCardDelivery.objects.bulk_create(
+            [GiftCardDelivery(share=share, phone_number=phone_number) for phone_number in phone_numbers]
+        )
+        transaction.on_commit(lambda: deliver_gift_card_share.delay(share.pk))
+    return share
+
+
+def _record(share, batch, results, final):
+    """
+    Store the outcome of one provider call. `results` is None when the call
+    failed outright: those deliveries stay pending for the next retry unless
+    this is the final attempt.
+    """
+    now = timezone.now()
+    sent = failed = 0
+    for delivery in batch:
+        delivery.attempts += 1
+        if results is None:
+            delivery.error = "Provider unavailable"
+            if not final:
+                continue
+            delivery.status = 'failed'
+            failed += 1
+            continue
+        error = results.get(delivery.phone_number, "No result from provider")
+        if error:
+            delivery.status, delivery.error = 'failed', str(error)[:255]
+            failed += 1
+        else:
+            delivery.status, delivery.error, delivery.sent_at = 'sent', '', now
+            sent += 1
+    GiftCardDelivery.objects.bulk_update(batch, ['status', 'attempts', 'error', 'sent_at'])
+    if sent or failed:
+        GiftCardShare.objects.filter(pk=share.pk).update(
+            sent_count=F('sent_count') + sent,
+            failed_count=F('failed_count') + failed,
+            update_time=now,
+        )
+
+
+def deliver_share(share_pk, final=False):
+    """
+    Send a share's pending deliveries through the message provider.
+
+    Recipients go out WHATSAPP_SEND_BATCH_SIZE per provider call, up to
+    WHATSAPP_SEND_WORKERS calls at a time, paced to WHATSAPP_SEND_RATE_LIMIT
+    messages per second. Results are stored after every wave of calls, so a
+    client polling the share sees progress, and only pending deliveries are
+    picked up, so re-running after a crash never sends twice to a recipient
+    already marked sent.
+
+    Returns the number of deliveries left pending because their provider
+    call failed; the caller retries those later.
+    """
+    share = GiftCardShare.objects.select_related('voucher__merchant', 'voucher__voucher_type').filter(
+        pk=share_pk
+    ).first()
+    if share is None or share.status in FINISHED_STATUSES:
+        return 0
+
+    GiftCardShare.objects.filter(pk=share.pk).update(
+        status='sending', started_at=share.started_at or timezone.now(), update_time=timezone.now()
+    )
+    provider = get_message_provider()
+    message = gift_card_message(share.voucher)
+    pending = list(share.deliveries.filter(status='pending').order_by('id'))
+    batches = list(chunks(pending, settings.WHATSAPP_SEND_BATCH_SIZE))
+    workers = settings.WHATSAPP_SEND_WORKERS
+    rate = settings.WHATSAPP_SEND_RATE_LIMIT
+
+    def send(batch):
+        try:
+            return provider.send_batch([delivery.phone_number for delivery in batch], message)
+        except Exception as exc:
+            logger.warning("Gift card share %s: provider call failed: %s", share.share_id, exc)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for wave in chunks(batches, workers):
+            started = time.monotonic()
+            for batch, results in zip(wave, pool.map(send, wave)):
+                _record(share, batch, results, final)
+            if rate:
+                remaining = sum(len(batch) for batch in wave) / rate - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    retryable = share.deliveries.filter(status='pending').count()
+    if not retryable:
+        share.refresh_from_db(fields=['sent_count', 'failed_count'])
+        if not share.failed_count:
+            final_status = 'completed'
+        elif share.sent_count:
+            final_status = 'partial'
+        else:
+            final_status = 'failed'
+        GiftCardShare.objects.filter(pk=share.pk).update(
+            status=final_status, completed_at=timezone.now(), update_time=timezone.now()
+        )
+    return retryable
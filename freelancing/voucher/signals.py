@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from freelancing.custom_auth.models import MerchantProfile
+from freelancing.utils.cache import invalidate_view_cache
+from freelancing.utils.images import schedule_derivatives
+from freelancing.voucher.ads import INDEX_NAMESPACE as ADVERTISEMENT_INDEX
+from freelancing.voucher.autocomplete import MERCHANT, VOUCHER, autocomplete_index
+from freelancing.voucher.models import Voucher, VoucherType, Advertisement
+from freelancing.voucher.search import update_search_vectors
+from freelancing.voucher.trending import update_category
+
+SEARCH_FIELDS = {"title", "message", "merchant", "merchant_id"}
+
+
+def _invalidate_on_commit(*namespaces):
+    transaction.on_commit(lambda: invalidate_view_cache(*namespaces))
+
+
+@receiver(post_save, sender=Voucher)
+@receiver(post_delete, sender=Voucher)
+def invalidate_voucher_cache(sender, instance, **kwargs):
+    _invalidate_on_commit("popular_vouchers", "featured_vouchers", ADVERTISEMENT_INDEX)
+
+
+@receiver(post_save, sender=VoucherType)
+@receiver(post_delete, sender=VoucherType)
+def invalidate_voucher_type_cache(sender, instance, **kwargs):
+    _invalidate_on_commit("voucher_categories", "popular_vouchers", "featured_vouchers")
+
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def invalidate_advertisement_cache(sender, instance, **kwargs):
+    _invalidate_on_commit(ADVERTISEMENT_INDEX)
+
+
+@receiver(post_save, sender=Voucher)
+def update_voucher_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    update_search_vectors(Voucher.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=MerchantProfile)
+def update_merchant_voucher_search_vectors(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and "business_name" not in update_fields):
+        return
+    update_search_vectors(Voucher.objects.filter(merchant=instance))
+
+
+@receiver(post_save, sender=Voucher)
+def update_voucher_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_voucher(instance))
+
+
+@receiver(post_save, sender=MerchantProfile)
+def update_merchant_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_merchant(instance))
+
+
+@receiver(post_save, sender=MerchantProfile)
+def invalidate_merchant_advertisements(sender, instance, created, **kwargs):
+    # Served ads carry the merchant name
+    if not created:
+        _invalidate_on_commit(ADVERTISEMENT_INDEX)
+
+
+@receiver(post_delete, sender=Voucher)
+def remove_voucher_autocomplete(sender, instance, **kwargs):
+    # The deletion collector clears instance.pk before an outer transaction commits
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(VOUCHER, pk))
+
+
+@receiver(post_delete, sender=MerchantProfile)
+def remove_merchant_autocomplete(sender, instance, **kwargs):
+    # The deletion collector clears instance.pk before an outer transaction commits
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(MERCHANT, pk))
+
+
+@receiver(post_save, sender=Voucher)
+@receiver(post_save, sender=Advertisement)
+def generate_voucher_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance)
+
+
+@receiver(post_save, sender=Voucher)
+def update_voucher_trending_category(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and "category" not in update_fields):
+        return
+    update_category(instance)
@@ -0,0 +1,40 @@
+from celery import shared_task
+from django.conf import settings
+
+from freelancing.voucher.ad_stats import ad_stats
+from freelancing.voucher.counters import reconcile_redemption_counters
+from freelancing.voucher.expiry import run_scheduled_expiry
+from freelancing.voucher.sharing import deliver_share
+from freelancing.voucher.trending import renormalize
+
+
+@shared_task(ignore_result=True)
+def reconcile_voucher_redemption_counters():
+    """Fold sharded redemption counts into Voucher.redemption_count"""
+    return reconcile_redemption_counters()
+
+
+@shared_task(ignore_result=True)
+def expire_overdue_vouchers():
+    """Expire overdue voucher purchases in chunks; returns the run metrics"""
+    return run_scheduled_expiry()
+
+
+@shared_task(ignore_result=True)
+def renormalize_trending_scores():
+    """Rescale trending scores to today's epoch and prune decayed rows"""
+    return renormalize()
+
+
+@shared_task(ignore_result=True)
+def flush_advertisement_stats():
+    """Add buffered advertisement impressions and clicks to the hourly rollups"""
+    return ad_stats.flush()
+
+
+@shared_task(bind=True, ignore_result=True, acks_late=True, max_retries=None)
+def deliver_gift_card_share(self, share_pk):
+    """Send a shared gift card; batches whose provider call failed are retried with backoff"""
+    final = self.request.retries >= settings.WHATSAPP_SEND_MAX_RETRIES
+    if deliver_share(share_pk, final=final):
+        raise self.retry(countdown=30 * 2 ** self.request.retries)
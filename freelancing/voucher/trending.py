@@ -0,0 +1,145 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Exp
+
+from freelancing.voucher.models import VoucherTrendingScore
+
+logger = logging.getLogger(__name__)
+
+PURCHASE_WEIGHT = 1.0
+REDEMPTION_WEIGHT = 1.0
+# Rows whose score decays below this at renormalization are dropped
+PRUNE_BELOW = 1e-4
+
+
+def _decay_rate():
+    """λ per second, from TRENDING_HALF_LIFE_HOURS"""
+    return math.log(2) / (getattr(settings, "TRENDING_HALF_LIFE_HOURS", 72) * 3600)
+
+
+def _growth(now, epoch):
+    """exp(λ·(now − epoch)) as a database expression"""
+    return Exp(
+        Value(_decay_rate(), output_field=FloatField())
+        * (Value(now, output_field=FloatField()) - epoch),
+        output_field=FloatField(),
+    )
+
+
+def _current_epoch(now):
+    latest = VoucherTrendingScore.objects.order_by("-epoch").values_list("epoch", flat=True).first()
+    return now if latest is None else latest
+
+
+def record_event(voucher_id, category_id, weight, now=None):
+    """
+    Add one weighted event to a voucher's trending score: a single UPDATE of
+    its row, creating the row on the voucher's first event
+    """
+    now = now or time.time()
+    rows = VoucherTrendingScore.objects.filter(voucher_id=voucher_id)
+    # Each row uses its own epoch, so an event racing the renormalization stays consistent
+    increment = Value(weight, output_field=FloatField()) * _growth(now, F("epoch"))
+    if rows.update(score=F("score") + increment):
+        return
+    epoch = _current_epoch(now)
+    try:
+        with transaction.atomic():
+            VoucherTrendingScore.objects.create(
+                voucher_id=voucher_id,
+                category_id=category_id,
+                epoch=epoch,
+                score=weight * math.exp(_decay_rate() * (now - epoch)),
+            )
+    except IntegrityError:
+        # Another request created the row first
+        rows.update(score=F("score") + increment)
+
+
+def record_event_on_commit(voucher, weight):
+    """
+    Record the event once the caller's transaction commits, so the hot score
+    row is locked for one autocommit UPDATE instead of the whole transaction
+    """
+    voucher_id, category_id = voucher.pk, voucher.category_id
+
+    def record():
+        try:
+            record_event(voucher_id, category_id, weight)
+        except Exception as exc:
+            logger.warning("Could not update trending score of voucher %s: %s", voucher_id, exc)
+
+    transaction.on_commit(record)
+
+
+def record_purchase(voucher):
+    record_event_on_commit(voucher, PURCHASE_WEIGHT)
+
+
+def record_redemption(voucher):
+    record_event_on_commit(voucher, REDEMPTION_WEIGHT)
+
+
+def top_vouchers(limit=10, category_id=None):
+    """
+    [(voucher_id, score)] of the highest scoring active, public vouchers,
+    read in score order from the (category, -score) / (-score) index.
+    Scores are decayed to the current time.
+    """
+    rows = VoucherTrendingScore.objects.filter(
+        voucher__is_active=True, voucher__is_gift_card=False, score__gt=0
+    )
+    if category_id:
+        rows = rows.filter(category_id=category_id)
+    now = time.time()
+    rate = _decay_rate()
+    return [
+        (voucher_id, score * math.exp(-rate * (now - epoch)))
+        for voucher_id, score, epoch in rows.order_by("-score").values_list("voucher_id", "score", "epoch")[:limit]
+    ]
+
+
+def ranked_vouchers(queryset, limit=10, category_id=None):
+    """
+    Up to `limit` vouchers of `queryset`: trending ones first by score, topped
+    up with the most redeemed of the rest while few vouchers have a score.
+    Returns (vouchers, {voucher_id: score}).
+    """
+    scores = dict(top_vouchers(limit=limit, category_id=category_id))
+    ranked = sorted(queryset.filter(pk__in=scores), key=lambda voucher: -scores[voucher.pk]) if scores else []
+    if len(ranked) < limit:
+        ranked += list(
+            queryset.filter(redemption_count__gt=0)
+            .exclude(pk__in=[voucher.pk for voucher in ranked])
+            .order_by("-redemption_count")[:limit - len(ranked)]
+        )
+    return ranked, scores
+
+
+def update_category(voucher):
+    """Keep the denormalized category of a voucher's score row in sync"""
+    VoucherTrendingScore.objects.filter(voucher_id=voucher.pk).exclude(
+        category_id=voucher.category_id
+    ).update(category_id=voucher.category_id)
+
+
+def renormalize(now=None):
+    """
+    Rescale every score to a new epoch of `now` in one UPDATE, so scores stay
+    bounded and rankings are unchanged, then drop rows that have decayed to
+    nothing. Returns the number of rows rescaled and pruned.
+    """
+    now = now or time.time()
+    with transaction.atomic():
+        rescaled = VoucherTrendingScore.objects.update(
+            score=F("score") / _growth(now, F("epoch")),
+            epoch=Value(now, output_field=FloatField()),
+        )
+        pruned, _ = VoucherTrendingScore.objects.filter(score__lt=PRUNE_BELOW).delete()
+    logger.info("Trending scores renormalized: %s rescaled, %s pruned", rescaled, pruned)
+    return {"rescaled": rescaled, "pruned": pruned}
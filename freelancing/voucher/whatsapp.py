@@ -0,0 +1,230 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from freelancing.voucher.models import WhatsAppContact
+
+logger = logging.getLogger(__name__)
+
+STATUS_CACHE_PREFIX = "whatsapp_status:"
+PHONE_NUMBER_MAX_LENGTH = WhatsAppContact._meta.get_field("phone_number").max_length
+
+
+class StatusProvider:
+    """Answers whether a phone number is registered on WhatsApp"""
+
+    def check_number(self, phone_number):
+        raise NotImplementedError
+
+
+class LocalStatusProvider(StatusProvider):
+    """
+    Offline provider for development and tests: every number is on WhatsApp
+    unless listed in WHATSAPP_STATUS_LOCAL_UNREGISTERED
+    """
+
+    def check_number(self, phone_number):
+        return phone_number not in getattr(settings, "WHATSAPP_STATUS_LOCAL_UNREGISTERED", ())
+
+
+class HttpStatusProvider(StatusProvider):
+    """
+    POSTs {"phone": ...} to WHATSAPP_STATUS_API_URL and reads `is_whatsapp`
+    from the JSON response
+    """
+
+    timeout = 5
+
+    def check_number(self, phone_number):
+        response = requests.post(
+            settings.WHATSAPP_STATUS_API_URL,
+            json={"phone": phone_number},
+            headers=_auth_headers(),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return bool(response.json().get("is_whatsapp", False))
+
+
+class MessageProvider:
+    """Sends one WhatsApp message to a batch of recipients"""
+
+    def send_batch(self, phone_numbers, message):
+        """
+        {phone_number: error} for every recipient, where error is None when
+        the message was accepted. Raising means the whole batch may be retried.
+        """
+        raise NotImplementedError
+
+
+class LocalMessageProvider(MessageProvider):
+    """Offline provider for development and tests: logs and accepts every message"""
+
+    def send_batch(self, phone_numbers, message):
+        logger.info("WhatsApp message to %s recipients: %s", len(phone_numbers), message)
+        return {phone_number: None for phone_number in phone_numbers}
+
+
+class HttpMessageProvider(MessageProvider):
+    """
+    POSTs {"recipients": [...], "message": ...} to WHATSAPP_MESSAGE_API_URL;
+    the JSON response lists rejected recipients as {"failed": {phone: reason}}
+    """
+
+    timeout = 10
+
+    def send_batch(self, phone_numbers, message):
+        response = requests.post(
+            settings.WHATSAPP_MESSAGE_API_URL,
+            json={"recipients": phone_numbers, "message": message},
+            headers=_auth_headers(),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        failed = response.json().get("failed") or {}
+        return {phone_number: failed.get(phone_number) for phone_number in phone_numbers}
+
+
+def _auth_headers():
+    if settings.WHATSAPP_API_TOKEN:
+        return {"Authorization": f"Bearer {settings.WHATSAPP_API_TOKEN}"}
+    return {}
+
+
+_providers = {}
+
+
+def _load_provider(setting_name):
+    if setting_name not in _providers:
+        _providers[setting_name] = import_string(getattr(settings, setting_name))()
+    return _providers[setting_name]
+
+
+def get_provider():
+    return _load_provider("WHATSAPP_STATUS_PROVIDER")
+
+
+def get_message_provider():
+    return _load_provider("WHATSAPP_MESSAGE_PROVIDER")
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resolve_statuses(phone_numbers, provider=None):
+    """
+    WhatsApp status of each number, shared by all users through the cache.
+
+    Numbers missing from the cache are checked concurrently on a thread pool
+    of WHATSAPP_STATUS_CHECK_WORKERS, WHATSAPP_STATUS_CHECK_BATCH_SIZE at a
+    time, and each batch is cached as soon as it completes. Numbers whose
+    check failed are left out of the result and are not cached.
+    """
+    phone_numbers = list(dict.fromkeys(phone_numbers))
+    cached = cache.get_many([STATUS_CACHE_PREFIX + number for number in phone_numbers])
+    statuses = {key[len(STATUS_CACHE_PREFIX):]: value for key, value in cached.items()}
+    missing = [number for number in phone_numbers if number not in statuses]
+    if not missing:
+        return statuses
+
+    provider = provider or get_provider()
+    with ThreadPoolExecutor(max_workers=settings.WHATSAPP_STATUS_CHECK_WORKERS) as pool:
+        for batch in chunks(missing, settings.WHATSAPP_STATUS_CHECK_BATCH_SIZE):
+            futures = {pool.submit(provider.check_number, number): number for number in batch}
+            checked = {}
+            for future in as_completed(futures):
+                number = futures[future]
+                try:
+                    checked[number] = bool(future.result())
+                except Exception as exc:
+                    logger.warning("WhatsApp status check failed for %s: %s", number, exc)
+            cache.set_many(
+                {STATUS_CACHE_PREFIX + number: value for number, value in checked.items()},
+                timeout=settings.WHATSAPP_STATUS_CACHE_TIMEOUT,
+            )
+            statuses.update(checked)
+    return statuses
+
+
+def normalise_contacts(contacts_data):
+    """
+    {phone_number: name} of the incoming contacts; blank and over-long
+    numbers are dropped and a repeated number keeps its last name
+    """
+    contacts = {}
+    for contact in contacts_data:
+        if not isinstance(contact, dict):
+            continue
+        phone_number = str(contact.get("phone_number") or "").strip()
+        if not phone_number or len(phone_number) > PHONE_NUMBER_MAX_LENGTH:
+            continue
+        contacts[phone_number] = str(contact.get("name") or "")[:255]
+    return contacts
+
+
+def sync_contacts(user, contacts_data, batch_size=None):
+    """
+    Make the user's stored contacts match `contacts_data`.
+
+    The incoming list is diffed against the stored rows by phone number:
+    new numbers are bulk-created, rows whose name or WhatsApp status changed
+    are bulk-updated, and numbers no longer in the list are deleted, all in
+    chunks of `batch_size` inside one transaction. Statuses are resolved
+    before the transaction opens; a number whose check failed keeps its
+    stored status (False for a new number).
+
+    Returns counts of created, updated, deleted, unchanged and skipped rows.
+    """
+    batch_size = batch_size or settings.WHATSAPP_CONTACT_SYNC_BATCH_SIZE
+    contacts = normalise_contacts(contacts_data)
+    statuses = resolve_statuses(list(contacts))
+
+    with transaction.atomic():
+        existing = {}
+        duplicate_ids = []
+        for row in WhatsAppContact.objects.filter(user=user).select_for_update().order_by("id"):
+            if row.phone_number in existing:
+                duplicate_ids.append(row.id)
+            else:
+                existing[row.phone_number] = row
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for phone_number, name in contacts.items():
+            row = existing.pop(phone_number, None)
+            if row is None:
+                to_create.append(WhatsAppContact(
+                    user=user,
+                    name=name,
+                    phone_number=phone_number,
+                    is_on_whatsapp=statuses.get(phone_number, False),
+                ))
+                continue
+            is_on_whatsapp = statuses.get(phone_number, row.is_on_whatsapp)
+            if row.name != name or row.is_on_whatsapp != is_on_whatsapp:
+                row.name, row.is_on_whatsapp, row.update_time = name, is_on_whatsapp, now
+                to_update.append(row)
+
+        to_delete = duplicate_ids + [row.id for row in existing.values()]
+        for chunk in chunks(to_delete, batch_size):
+            WhatsAppContact.objects.filter(id__in=chunk).delete()
+        WhatsAppContact.objects.bulk_create(to_create, batch_size=batch_size)
+        WhatsAppContact.objects.bulk_update(
+            to_update, ["name", "is_on_whatsapp", "update_time"], batch_size=batch_size
+        )
+
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "unchanged": len(contacts) - len(to_create) - len(to_update),
+        "skipped": len(contacts_data) - len(contacts),
+    }